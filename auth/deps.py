@@ -1,19 +1,60 @@
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
 from auth.config import SECRET_KEY, ALGORITHM
-from src.configurations.database import get_async_session
+from src.configurations.database import call_after_commit, get_async_session
+from src.configurations.settings import settings
 from src.models.users import User
+from src.monitoring.metrics import record_phase
+from src.services.cache import LRUCacheBackend
 from sqlalchemy import select
 
 bearer_scheme = HTTPBearer()
 
+# Кеш пользователей по sub из токена. Запись живет не дольше, чем действует токен,
+# поэтому в установившемся режиме защищенные ручки не делают ни одного запроса на авторизацию.
+principal_cache = LRUCacheBackend(
+    max_size=settings.principal_cache_max_size, ttl=settings.principal_cache_ttl_seconds
+)
+
+# Метка в кеше для id, которых нет в users_table (негативное кеширование)
+UNKNOWN_USER = "unknown"
+
+
+def principal_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+async def invalidate_principal(user_id: int) -> None:
+    # Вызывать при удалении или изменении пользователя в обход ORM (например, bulk delete)
+    await principal_cache.delete(principal_key(user_id))
+
+
+# Удаление или изменение пользователя через ORM сбрасывает его запись в кеше автоматически, после commit
+@event.listens_for(User, "after_delete")
+@event.listens_for(User, "after_update")
+def _forget_principal(mapper, connection, target: User) -> None:
+    call_after_commit(object_session(target), invalidate_principal, target.id)
+
 
 async def get_current_user(
         token: HTTPAuthorizationCredentials = Depends(bearer_scheme),
         session: AsyncSession = Depends(get_async_session),
 ) -> User:
+    # Время авторизации попадает в заголовок Server-Timing как фаза auth
+    started = time.perf_counter()
+    try:
+        return await _authenticate(token, session)
+    finally:
+        record_phase("auth", time.perf_counter() - started)
+
+
+async def _authenticate(token: HTTPAuthorizationCredentials, session: AsyncSession) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -23,13 +64,27 @@ async def get_current_user(
     try:
         payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = int(payload.get("sub"))
-    except (JWTError, ValueError):
+    except (JWTError, ValueError, TypeError):
         raise credentials_exception
 
+    key = principal_key(user_id)
+    cached = await principal_cache.get(key)
+    if cached == UNKNOWN_USER:
+        raise credentials_exception
+    if cached is not None:
+        return cached
+
     result = await session.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
 
     if user is None:
+        await principal_cache.set(key, UNKNOWN_USER, ttl=settings.principal_negative_cache_ttl_seconds)
         raise credentials_exception
 
-    return user
+    # В кеш кладем отвязанную от сессии копию без хеша пароля:
+    # объект живет дольше сессии и разделяется между запросами.
+    principal = User(id=user.id, e_mail=user.e_mail)
+    expires_in = payload.get("exp", time.time()) - time.time()
+    await principal_cache.set(key, principal, ttl=max(expires_in, 0))
+
+    return principal
@@ -1,9 +1,24 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
 from jose import jwt
 from passlib.context import CryptContext
 from auth.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from src.configurations.settings import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
+
+# bcrypt занимает процессор на десятки миллисекунд и отпускает GIL,
+# поэтому считаем его в отдельном пуле потоков, а не в цикле событий uvicorn.
+# Одновременно выполняется не больше password_hash_workers хешей, остальные ждут в очереди,
+# а при переполнении очереди запрос сразу получает 503.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers, thread_name_prefix="password-hash"
+)
+_hash_slots = asyncio.Semaphore(settings.password_hash_workers)
+_hash_running = 0
+_hash_queued = 0
 
 
 def verify_password(plain, hashed):
@@ -14,6 +29,51 @@ def hash_password(password):
     return pwd_context.hash(password)
 
 
+async def _run_in_hash_pool(func, *args):
+    global _hash_running, _hash_queued
+
+    if _hash_queued >= settings.password_hash_max_queue:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+    _hash_queued += 1
+    try:
+        await _hash_slots.acquire()
+    finally:
+        _hash_queued -= 1
+
+    _hash_running += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_running -= 1
+        _hash_slots.release()
+
+
+async def verify_password_async(plain, hashed):
+    return await _run_in_hash_pool(verify_password, plain, hashed)
+
+
+async def hash_password_async(password):
+    return await _run_in_hash_pool(hash_password, password)
+
+
+def password_hashing_stats() -> dict:
+    return {
+        "workers": settings.password_hash_workers,
+        "running": _hash_running,
+        "queued": _hash_queued,
+        "max_queue": settings.password_hash_max_queue,
+    }
+
+
+def shutdown_password_hashing() -> None:
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
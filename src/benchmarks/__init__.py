@@ -0,0 +1,2 @@
+# Нагрузочные бенчмарки ручек v1_router.
+# Запуск из корня проекта: python -m src.benchmarks --help
@@ -0,0 +1,117 @@
+# Нагрузочный бенчмарк всех ручек v1_router.
+# python -m src.benchmarks --sellers 100 --books-per-seller 50 --concurrency 1,10,50 --baseline bench_baseline.json
+# Код выхода 1, если есть ручки без сценария или регрессии относительно эталона.
+import argparse
+import asyncio
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from src.benchmarks.report import compare_reports, load_report, save_report
+from src.benchmarks.runner import PROJECT_ROOT, run_asgi, run_uvicorn, seed
+from src.benchmarks.scenarios import BULK_DELETE_SIZE, SCENARIOS, BenchContext, uncovered_routes
+from src.routers import v1_router
+
+TRANSPORTS = {"asgi": run_asgi, "uvicorn": run_uvicorn}
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m src.benchmarks", description=__doc__)
+    parser.add_argument("--sellers", type=int, default=100)
+    parser.add_argument("--books-per-seller", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="запросов на каждый уровень конкурентности")
+    parser.add_argument("--warmup", type=int, default=10, help="запросов на прогрев каждой ручки")
+    parser.add_argument("--concurrency", default="1,10,50", help="уровни через запятую")
+    parser.add_argument("--transport", choices=[*TRANSPORTS, "both"], default="both")
+    parser.add_argument("--routes", nargs="*", default=[], help="подстроки ключей ручек, например 'GET /api/v1/books'")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="эталонный отчет для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение, доля")
+    parser.add_argument("--update-baseline", action="store_true", help="записать результат в --baseline")
+    args = parser.parse_args(argv)
+    if args.sellers < 1 or args.books_per_seller < 1:
+        parser.error("--sellers and --books-per-seller must be positive")
+    args.concurrency = sorted({int(level) for level in args.concurrency.split(",")})
+    return args
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    routes = [route for route in SCENARIOS if not args.routes or any(part in route for part in args.routes)]
+    # На каждый DELETE-запрос нужна своя запись
+    disposable = args.warmup + args.requests * len(args.concurrency)
+    # POST /sellers/bulk-delete удаляет за запрос сразу BULK_DELETE_SIZE продавцов
+    disposable_sellers = disposable
+    if any("bulk-delete" in route for route in routes):
+        disposable_sellers *= BULK_DELETE_SIZE + 1
+    transports = list(TRANSPORTS) if args.transport == "both" else [args.transport]
+
+    results = {}
+    for transport in transports:
+        # Каждый транспорт стартует с одинаковых данных
+        data = await seed(args.sellers, args.books_per_seller, disposable, args.seed, disposable_sellers)
+        ctx = BenchContext(data=data, rng=random.Random(args.seed))
+        print(f"--- {transport}")
+        results[transport] = await TRANSPORTS[transport](
+            ctx, routes, args.requests, args.concurrency, args.warmup
+        )
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sellers": args.sellers,
+            "books_per_seller": args.books_per_seller,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+
+    if missing := uncovered_routes(v1_router):
+        print("No benchmark scenario for:", *missing, sep="\n  ", file=sys.stderr)
+        return 1
+
+    report = asyncio.run(_run(args))
+    save_report(args.output, report)
+    print(f"Results saved to {args.output}")
+
+    if not args.baseline:
+        return 0
+    if args.update_baseline:
+        save_report(args.baseline, report)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    baseline = load_report(args.baseline)
+    if baseline is None:
+        print(f"Baseline {args.baseline} not found, run with --update-baseline to create it", file=sys.stderr)
+        return 0
+
+    regressions = compare_reports(report, baseline, args.tolerance)
+    for regression in regressions:
+        print("REGRESSION", regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# Сводка замеров бенчмарка и сравнение с сохраненным эталоном.
+# Формат отчета:
+# {"meta": {...}, "results": {"asgi": {"GET /api/v1/books/": {"10": {"rps": ..., "p50_ms": ..., ...}}}}}
+import json
+import math
+from typing import Optional
+
+__all__ = ["compare_reports", "load_report", "percentile", "save_report", "summarize"]
+
+# Изменения p99 меньше этого порога считаем шумом даже при большом относительном росте
+MIN_LATENCY_DELTA_MS = 1.0
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Квантиль по ближайшему рангу. values должны быть отсортированы."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(q * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(latencies: list[float], statuses: dict[int, int], elapsed: float) -> dict:
+    """Итог одного уровня нагрузки. latencies и elapsed в секундах."""
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def compare_reports(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Регрессии относительно эталона: p99 выросло или пропускная способность упала
+    больше чем на tolerance (доля). Сравниваются только замеры, которые есть в обоих отчетах."""
+    regressions = []
+    for transport, routes in current["results"].items():
+        for route, levels in routes.items():
+            for level, result in levels.items():
+                base = baseline.get("results", {}).get(transport, {}).get(route, {}).get(level)
+                if base is None:
+                    continue
+                name = f"{transport} {route} c={level}"
+                p99_limit = max(base["p99_ms"] * (1 + tolerance), base["p99_ms"] + MIN_LATENCY_DELTA_MS)
+                if result["p99_ms"] > p99_limit:
+                    regressions.append(f"{name}: p99 {base['p99_ms']:.1f}ms -> {result['p99_ms']:.1f}ms")
+                if result["rps"] < base["rps"] * (1 - tolerance):
+                    regressions.append(f"{name}: throughput {base['rps']:.1f} -> {result['rps']:.1f} req/s")
+                if result["errors"] > base["errors"]:
+                    regressions.append(f"{name}: errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def load_report(path: str) -> Optional[dict]:
+    try:
+        with open(path) as report:
+            return json.load(report)
+    except FileNotFoundError:
+        return None
+
+
+def save_report(path: str, report: dict) -> None:
+    with open(path, "w") as output:
+        json.dump(report, output, indent=2, ensure_ascii=False)
+        output.write("\n")
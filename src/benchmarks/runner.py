@@ -0,0 +1,131 @@
+# Прогон сценариев на заданных уровнях конкурентности.
+# asgi - приложение в том же процессе через httpx.ASGITransport, как в тестах (без сети и сервера);
+# uvicorn - настоящий сервер в отдельном процессе, запросы идут через TCP.
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Optional
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.benchmarks.report import summarize
+from src.benchmarks.scenarios import SCENARIOS, BenchContext
+from src.benchmarks.seed import SeedData, seed_database
+from src.configurations.settings import settings
+
+__all__ = ["run_asgi", "run_level", "run_uvicorn", "seed"]
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+REQUEST_TIMEOUT = 60.0
+SERVER_START_TIMEOUT = 30.0
+
+
+async def seed(
+    sellers: int, books_per_seller: int, disposable: int, random_seed: int, disposable_sellers: Optional[int] = None
+) -> SeedData:
+    engine = create_async_engine(settings.database_test_url)
+    try:
+        return await seed_database(engine, sellers, books_per_seller, disposable, random_seed, disposable_sellers)
+    finally:
+        await engine.dispose()
+
+
+async def run_level(client: httpx.AsyncClient, ctx: BenchContext, route: str, requests: int, concurrency: int) -> dict:
+    """requests запросов к одной ручке, не больше concurrency одновременно."""
+    method = route.split(" ", 1)[0]
+    scenario = SCENARIOS[route]
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    # Общий итератор на всех воркеров: next() не уступает цикл событий, номера не повторяются
+    numbers = iter(range(requests))
+
+    async def worker():
+        for _ in numbers:
+            kwargs = scenario(ctx)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, **kwargs)
+                statuses[response.status_code] += 1
+                if location := response.headers.get("location"):
+                    ctx.locations.append(location)
+            except httpx.HTTPError:
+                statuses[599] += 1  # соединение оборвалось, ответа нет
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+async def _run_routes(client, ctx, routes, requests, levels, warmup) -> dict:
+    results = {}
+    for route in routes:
+        # Прогрев: соединения пула, кеши и ленивые импорты не должны попадать в замер
+        await run_level(client, ctx, route, warmup, 1)
+        results[route] = {}
+        for concurrency in levels:
+            results[route][str(concurrency)] = result = await run_level(client, ctx, route, requests, concurrency)
+            print(
+                f"{route:<45} c={concurrency:<4} {result['rps']:>9.1f} req/s"
+                f"  p50 {result['p50_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  errors {result['errors']}"
+            )
+    return results
+
+
+async def run_asgi(ctx: BenchContext, routes, requests, levels, warmup) -> dict:
+    from src.configurations import database
+    from src.main import app
+
+    # Приложение в этом процессе работает с тестовой БД, реплика не используется
+    database.SQLALCHEMY_DATABASE_URL = settings.database_test_url
+    settings.db_replica_host = None
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=REQUEST_TIMEOUT) as client:
+            return await _run_routes(client, ctx, routes, requests, levels, warmup)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_for_server(client: httpx.AsyncClient, process: subprocess.Popen) -> None:
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+        try:
+            await client.get("/metrics")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+async def run_uvicorn(ctx: BenchContext, routes, requests, levels, warmup) -> dict:
+    port = _free_port()
+    env = {**os.environ, "DB_NAME": settings.db_test_name, "DB_REPLICA_HOST": ""}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", timeout=REQUEST_TIMEOUT, limits=limits
+        ) as client:
+            await _wait_for_server(client, process)
+            return await _run_routes(client, ctx, routes, requests, levels, warmup)
+    finally:
+        process.terminate()
+        process.wait()
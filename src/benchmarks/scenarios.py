@@ -0,0 +1,180 @@
+# Сценарии нагрузки: по одному на каждую ручку v1_router.
+# Сценарий по номеру запроса собирает аргументы для httpx (url, json, files, headers).
+# Ключ сценария - метод и шаблон пути ручки, как в метриках: "GET /api/v1/books/{book_id}".
+import csv
+import io
+import itertools
+import random
+from dataclasses import dataclass, field
+from typing import Callable
+
+from src.benchmarks.seed import BENCH_USER_EMAIL, BENCH_USER_PASSWORD, SeedData
+
+__all__ = ["BULK_DELETE_SIZE", "SCENARIOS", "BenchContext", "route_key", "uncovered_routes"]
+
+API = "/api/v1"
+
+# Размер пакета для /books/bulk и /books/import
+BULK_SIZE = 100
+# Сколько продавцов удаляет один запрос POST /sellers/bulk-delete
+BULK_DELETE_SIZE = 10
+
+
+@dataclass
+class BenchContext:
+    data: SeedData
+    rng: random.Random
+    # Ссылки из заголовков Location ответов (например, на фоновые задачи), их собирает раннер
+    locations: list[str] = field(default_factory=list)
+    _serial: itertools.count = field(default_factory=itertools.count)
+
+    def serial(self) -> int:
+        # Уникальный номер для записей, которые не должны совпадать между запросами (e-mail и т.п.)
+        return next(self._serial)
+
+    def seller_id(self) -> int:
+        return self.rng.choice(self.data.seller_ids)
+
+    def book_id(self) -> int:
+        return self.rng.choice(self.data.book_ids)
+
+    def new_book(self) -> dict:
+        return {
+            "title": f"Bench book {self.serial()}",
+            "author": f"Author {self.rng.randrange(1000)}",
+            "year": self.rng.randint(2020, 2025),
+            "count_pages": self.rng.randint(50, 1500),
+            "seller_id": self.seller_id(),
+        }
+
+
+Scenario = Callable[[BenchContext], dict]
+
+
+def route_key(method: str, path: str) -> str:
+    return f"{method} {path}"
+
+
+def _books_csv(ctx: BenchContext) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["title", "author", "year", "pages", "seller_id"])
+    for _ in range(BULK_SIZE):
+        book = ctx.new_book()
+        writer.writerow([book["title"], book["author"], book["year"], book["count_pages"], book["seller_id"]])
+    return buffer.getvalue().encode()
+
+
+def _update_book(ctx: BenchContext) -> dict:
+    book_id = ctx.book_id()
+    return {
+        "url": f"{API}/books/{book_id}",
+        "headers": ctx.data.auth_headers,
+        "json": {
+            "id": book_id,
+            "title": f"Updated {ctx.serial()}",
+            "author": "Bench author",
+            "year": 2024,
+            "pages": 300,
+            "seller_id": ctx.data.book_sellers[book_id],
+        },
+    }
+
+
+def _create_seller(ctx: BenchContext) -> dict:
+    return {
+        "url": f"{API}/sellers/",
+        "json": {
+            "first_name": "Bench",
+            "second_name": "Seller",
+            "sellers_mail": f"new{ctx.serial()}@bench.example.com",
+            "sellers_password": "benchmark",
+        },
+    }
+
+
+SCENARIOS: dict[str, Scenario] = {
+    route_key("POST", f"{API}/books/"): lambda ctx: {
+        "url": f"{API}/books/", "json": ctx.new_book(), "headers": ctx.data.auth_headers,
+    },
+    route_key("POST", f"{API}/books/bulk"): lambda ctx: {
+        "url": f"{API}/books/bulk",
+        "json": [ctx.new_book() for _ in range(BULK_SIZE)],
+        "headers": ctx.data.auth_headers,
+    },
+    route_key("POST", f"{API}/books/import"): lambda ctx: {
+        "url": f"{API}/books/import",
+        "files": {"file": ("books.csv", _books_csv(ctx), "text/csv")},
+        "headers": ctx.data.auth_headers,
+    },
+    route_key("GET", f"{API}/books/"): lambda ctx: {
+        "url": f"{API}/books/", "params": {"seller_id": ctx.seller_id(), "sort": "-year"},
+    },
+    route_key("GET", f"{API}/books/facets"): lambda ctx: {
+        "url": f"{API}/books/facets", "params": ctx.rng.choice([{}, {"seller_id": ctx.seller_id()}, {"year_from": 2020}]),
+    },
+    route_key("GET", f"{API}/books/search"): lambda ctx: {
+        "url": f"{API}/books/search", "params": {"q": ctx.rng.choice(["Book 1", "Author 2", "book author"])},
+    },
+    route_key("GET", f"{API}/books/suggest"): lambda ctx: {
+        "url": f"{API}/books/suggest", "params": {"prefix": ctx.rng.choice(["B", "Book 1", "Author 9", "x"])},
+    },
+    route_key("GET", f"{API}/books/{{book_id}}"): lambda ctx: {"url": f"{API}/books/{ctx.book_id()}"},
+    route_key("DELETE", f"{API}/books/{{book_id}}"): lambda ctx: {
+        "url": f"{API}/books/{ctx.data.disposable_book_ids.pop()}",
+    },
+    route_key("PUT", f"{API}/books/{{book_id}}"): _update_book,
+    route_key("PATCH", f"{API}/books/{{book_id}}"): lambda ctx: {
+        "url": f"{API}/books/{ctx.book_id()}", "json": {"pages": ctx.rng.randint(50, 1500)},
+        "headers": ctx.data.auth_headers,
+    },
+    route_key("POST", f"{API}/sellers/"): _create_seller,
+    route_key("GET", f"{API}/sellers/"): lambda ctx: {
+        "url": f"{API}/sellers/",
+        "params": ctx.rng.choice(
+            [{}, {"include": "books"}, {"include": "books", "books_limit": 5, "books_order": "-year"}]
+        ),
+    },
+    route_key("GET", f"{API}/sellers/export"): lambda ctx: {
+        "url": f"{API}/sellers/export", "params": {"format": ctx.rng.choice(["ndjson", "csv"])},
+    },
+    route_key("POST", f"{API}/sellers/bulk-delete"): lambda ctx: {
+        "url": f"{API}/sellers/bulk-delete",
+        "json": {"ids": [ctx.data.disposable_seller_ids.pop() for _ in range(BULK_DELETE_SIZE)]},
+        "headers": ctx.data.auth_headers,
+    },
+    # Задачи, созданные сценарием POST /sellers/bulk-delete. Если он не запускался, задач нет и ответ будет 404
+    route_key("GET", f"{API}/sellers/bulk-delete/{{job_id}}"): lambda ctx: {
+        "url": ctx.rng.choice(ctx.locations) if ctx.locations else f"{API}/sellers/bulk-delete/unknown",
+    },
+    route_key("GET", f"{API}/sellers/stats"): lambda ctx: {
+        "url": f"{API}/sellers/stats", "params": {"ids": [ctx.seller_id() for _ in range(20)]},
+    },
+    route_key("GET", f"{API}/sellers/{{seller_id}}/stats"): lambda ctx: {"url": f"{API}/sellers/{ctx.seller_id()}/stats"},
+    route_key("GET", f"{API}/sellers/{{seller_id}}"): lambda ctx: {
+        "url": f"{API}/sellers/{ctx.seller_id()}", "params": ctx.rng.choice([{}, {"include": "books"}]),
+        "headers": ctx.data.auth_headers,
+    },
+    route_key("DELETE", f"{API}/sellers/{{seller_id}}"): lambda ctx: {
+        "url": f"{API}/sellers/{ctx.data.disposable_seller_ids.pop()}",
+    },
+    route_key("PUT", f"{API}/sellers/{{seller_id}}"): lambda ctx: {
+        "url": f"{API}/sellers/{ctx.seller_id()}", "json": {"first_name": f"Renamed{ctx.serial()}"},
+    },
+    route_key("POST", f"{API}/token"): lambda ctx: {
+        "url": f"{API}/token", "json": {"e_mail": BENCH_USER_EMAIL, "password": BENCH_USER_PASSWORD},
+    },
+    route_key("GET", f"{API}/internal/cache"): lambda ctx: {"url": f"{API}/internal/cache"},
+    route_key("GET", f"{API}/internal/password-hashing"): lambda ctx: {"url": f"{API}/internal/password-hashing"},
+    route_key("GET", f"{API}/internal/pool"): lambda ctx: {"url": f"{API}/internal/pool"},
+}
+
+
+def uncovered_routes(router) -> list[str]:
+    """Ручки роутера, для которых нет сценария. Новая ручка должна сразу получать сценарий."""
+    return [
+        route_key(method, route.path)
+        for route in router.routes
+        for method in sorted(route.methods)
+        if route_key(method, route.path) not in SCENARIOS
+    ]
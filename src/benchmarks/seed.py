@@ -0,0 +1,124 @@
+# Наполнение тестовой БД данными для бенчмарка.
+# Таблицы пересоздаются, поэтому каждый прогон стартует с одинакового состояния.
+import random
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from auth.utils import create_access_token, hash_password
+from src.configurations.database import recreate_db
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.models.users import User
+
+__all__ = ["BENCH_USER_EMAIL", "BENCH_USER_PASSWORD", "SeedData", "seed_database"]
+
+BENCH_USER_EMAIL = "bench@example.com"
+BENCH_USER_PASSWORD = "benchmark"
+
+# Размер пачки в executemany: insertmanyvalues все равно склеивает строки в многострочные INSERT
+SEED_CHUNK_SIZE = 5000
+
+
+@dataclass
+class SeedData:
+    """Что лежит в БД после наполнения. Сценарии берут отсюда id для запросов."""
+
+    seller_ids: list[int]
+    book_ids: list[int]
+    book_sellers: dict[int, int]
+    # Записи, которые можно удалять: по одной на каждый DELETE-запрос бенчмарка
+    disposable_seller_ids: list[int] = field(default_factory=list)
+    disposable_book_ids: list[int] = field(default_factory=list)
+    auth_headers: dict[str, str] = field(default_factory=dict)
+
+
+async def _insert_returning_ids(connection, model, rows: list[dict]) -> list[int]:
+    ids = []
+    for start in range(0, len(rows), SEED_CHUNK_SIZE):
+        result = await connection.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows[start:start + SEED_CHUNK_SIZE],
+        )
+        ids.extend(result.scalars().all())
+    return ids
+
+
+def _seller_row(number: int) -> dict:
+    return {
+        "first_name": f"Seller{number}",
+        "second_name": "Bench",
+        "e_mail": f"seller{number}@bench.example.com",
+        "password": "benchmark",
+    }
+
+
+def _book_row(rng: random.Random, number: int, seller_id: int) -> dict:
+    return {
+        "title": f"Book {number}",
+        "author": f"Author {rng.randrange(1000)}",
+        "year": rng.randint(2000, 2025),
+        "pages": rng.randint(50, 1500),
+        "seller_id": seller_id,
+    }
+
+
+async def seed_database(
+    engine: AsyncEngine,
+    sellers: int,
+    books_per_seller: int,
+    disposable: int,
+    seed: int = 0,
+    disposable_sellers: Optional[int] = None,
+) -> SeedData:
+    """Пересоздает таблицы и заполняет их: sellers продавцов по books_per_seller книг,
+    плюс disposable книг и disposable_sellers (по умолчанию disposable) продавцов для сценариев удаления.
+    У продавцов на удаление тоже по books_per_seller книг: удаление меряется вместе с каскадом."""
+    rng = random.Random(seed)
+    if disposable_sellers is None:
+        disposable_sellers = disposable
+
+    await recreate_db(engine)
+    async with engine.begin() as connection:
+        seller_ids = await _insert_returning_ids(
+            connection, Seller, [_seller_row(number) for number in range(sellers)]
+        )
+        disposable_seller_ids = await _insert_returning_ids(
+            connection, Seller, [_seller_row(sellers + number) for number in range(disposable_sellers)]
+        )
+
+        book_rows = [
+            _book_row(rng, number, seller_id)
+            for seller_id in seller_ids
+            for number in range(books_per_seller)
+        ]
+        book_ids = await _insert_returning_ids(connection, Book, book_rows)
+        await _insert_returning_ids(
+            connection, Book,
+            [
+                _book_row(rng, number, seller_id)
+                for seller_id in disposable_seller_ids
+                for number in range(books_per_seller)
+            ],
+        )
+        disposable_rows = [_book_row(rng, number, rng.choice(seller_ids)) for number in range(disposable)]
+        disposable_book_ids = await _insert_returning_ids(connection, Book, disposable_rows)
+
+        user_id = (
+            await connection.execute(
+                insert(User).returning(User.id),
+                {"e_mail": BENCH_USER_EMAIL, "password": hash_password(BENCH_USER_PASSWORD)},
+            )
+        ).scalar_one()
+
+    token = create_access_token({"sub": str(user_id)})
+    return SeedData(
+        seller_ids=seller_ids,
+        book_ids=book_ids,
+        book_sellers={book_id: row["seller_id"] for book_id, row in zip(book_ids, book_rows)},
+        disposable_seller_ids=disposable_seller_ids,
+        disposable_book_ids=disposable_book_ids,
+        auth_headers={"Authorization": f"Bearer {token}"},
+    )
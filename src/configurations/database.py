@@ -1,6 +1,12 @@
+import asyncio
 import logging
+import os
+import time
 
-from typing import AsyncGenerator, Callable, Optional
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional, Union
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -10,27 +16,237 @@ from sqlalchemy.ext.asyncio import (
 
 from src.models.base import BaseModel
 from src.configurations.settings import settings
+from src.monitoring.metrics import instrument_engine
 
-__all__ = ["global_init", "get_async_session", "create_db_and_tables"]
+__all__ = [
+    "global_init",
+    "get_async_session",
+    "get_session_factory",
+    "get_async_read_session",
+    "get_read_session_factory",
+    "migrate_db",
+    "recreate_db",
+    "create_engine",
+    "get_engine",
+    "get_read_engine",
+    "warm_up_pool",
+    "pool_stats",
+    "call_after_commit",
+    "run_after_commit",
+    "discard_after_commit",
+    "is_replica_session",
+]
 
 logger = logging.getLogger("__name__")
 
 __async_engine: Optional[AsyncEngine] = None
+__read_engine: Optional[AsyncEngine] = None
 __session_factory: Optional[Callable[[], AsyncSession]] = None
+__read_only_session_factory: Optional[Callable[[], AsyncSession]] = None
+
+# Необязательная реплика для GET-ручек
+__replica_engine: Optional[AsyncEngine] = None
+__replica_session_factory: Optional[Callable[[], AsyncSession]] = None
+__replica_read_only_session_factory: Optional[Callable[[], AsyncSession]] = None
+__replica_checked_at: float = float("-inf")
+__replica_usable: bool = False
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
+# Ключ в session.info, которым помечены сессии реплики
+_REPLICA_KEY = "replica"
+# Ключ в session.info со списком отложенных до commit вызовов
+_AFTER_COMMIT_KEY = "after_commit_callbacks"
+
+# Схемой БД управляют миграции Alembic (src/migrations), конфиг лежит в корне репозитория
+ALEMBIC_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini"
+)
+
+# Отставание реплики в секундах. Если реплика догнала primary по WAL, отставание 0,
+# даже когда последняя транзакция была давно. На обычной (не реплике) базе тоже 0.
+_replica_lag_query = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который считает, сколько запросы ждали соединение (включая открытие нового)."""
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+
+class ReadOnlySession(Session):
+    """Сессия, которая не дает записать изменения через ORM. Работает в autocommit, без BEGIN/COMMIT."""
+
+    def flush(self, objects=None):
+        if self.new or self.deleted or self.dirty:
+            raise RuntimeError("Read-only session cannot write, use get_async_session")
+
+
+def create_read_only_session_factory(engine: AsyncEngine) -> Callable[[], AsyncSession]:
+    # ReadOnlySession ловит только flush ORM. Чтобы БД отклоняла и прямые UPDATE/DELETE,
+    # engine создается с create_engine(url, read_only=True).
+    # В режиме AUTOCOMMIT драйвер asyncpg не открывает транзакцию вовсе:
+    # каждый SELECT выполняется сам по себе, а закрытие сессии не шлет ROLLBACK.
+    return async_sessionmaker(
+        engine.execution_options(isolation_level="AUTOCOMMIT"),
+        sync_session_class=ReadOnlySession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+def create_engine(url: str, read_only: bool = False) -> AsyncEngine:
+    # read_only=True - все транзакции соединений движка, и неявные в autocommit тоже, только для чтения.
+    # Запись отклоняет сам Postgres: "cannot execute UPDATE in a read-only transaction".
+    # У такого движка и свой размер пула: db_read_pool_size и db_read_pool_max_overflow.
+    connect_args = {"server_settings": {"default_transaction_read_only": "on"}} if read_only else {}
+    engine = create_async_engine(
+        url=url,
+        connect_args=connect_args,
+        echo=settings.db_echo,
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_read_pool_size if read_only else settings.max_connection_count,
+        max_overflow=settings.db_read_pool_max_overflow if read_only else settings.db_pool_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    # Счетчики запросов к БД для /metrics
+    instrument_engine(engine)
+    return engine
+
 
 def global_init() -> None:
-    global __async_engine, __session_factory
+    global __async_engine, __read_engine, __session_factory, __read_only_session_factory
 
     if __session_factory:
         return
 
     if not __async_engine:
-        __async_engine = create_async_engine(url=SQLALCHEMY_DATABASE_URL, echo=True)
+        __async_engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    # Для GET-ручек отдельный пул соединений только для чтения
+    __read_engine = create_engine(SQLALCHEMY_DATABASE_URL, read_only=True)
 
     __session_factory = async_sessionmaker(__async_engine)
+    __read_only_session_factory = create_read_only_session_factory(__read_engine)
+
+    if settings.database_replica_url:
+        init_replica(settings.database_replica_url)
+
+
+def init_replica(url: Optional[str]) -> None:
+    # url=None отключает реплику
+    global __replica_engine, __replica_session_factory, __replica_read_only_session_factory, __replica_checked_at
+
+    __replica_engine = create_engine(url, read_only=True) if url else None
+    __replica_session_factory = async_sessionmaker(__replica_engine) if __replica_engine else None
+    __replica_read_only_session_factory = (
+        create_read_only_session_factory(__replica_engine) if __replica_engine else None
+    )
+    __replica_checked_at = float("-inf")
+
+
+async def replica_lag(engine: AsyncEngine) -> float:
+    async with engine.connect() as connection:
+        return float((await connection.execute(_replica_lag_query)).scalar_one())
+
+
+async def use_replica() -> bool:
+    """Читать ли из реплики: она настроена, доступна и не слишком отстает."""
+    global __replica_checked_at, __replica_usable
+
+    if __replica_session_factory is None:
+        return False
+
+    # Отставание проверяем не на каждый запрос, а раз в db_replica_lag_check_interval секунд
+    now = time.monotonic()
+    if now - __replica_checked_at >= settings.db_replica_lag_check_interval:
+        __replica_checked_at = now
+        try:
+            lag = await replica_lag(__replica_engine)
+            __replica_usable = lag <= settings.db_replica_max_lag_seconds
+            if not __replica_usable:
+                logger.warning("Replica lags %.1f s behind, reading from primary", lag)
+        except Exception as e:
+            logger.error("Replica is unavailable, reading from primary: %s", e)
+            __replica_usable = False
+
+    return __replica_usable
+
+
+async def choose_read_session_factory() -> Callable[[], AsyncSession]:
+    # Транзакционная фабрика для чтения (серверным курсорам нужна транзакция)
+    return __replica_session_factory if await use_replica() else get_session_factory()
+
+
+def _get_engine(engine: Optional[AsyncEngine]) -> AsyncEngine:
+    global __async_engine
+
+    engine = engine or __async_engine
+    if engine is None:
+        raise ValueError(
+            {"message": "You must call global_init() before using this method"}
+        )
+    return engine
+
+
+def get_engine() -> AsyncEngine:
+    """Движок основной БД. Для служебных задач при старте приложения, ручки работают через сессии."""
+    return _get_engine(None)
+
+
+def get_read_engine() -> AsyncEngine:
+    """Движок основной БД только для чтения, на нем работает get_async_read_session."""
+    if __read_engine is None:
+        raise ValueError(
+            {"message": "You must call global_init() before using this method"}
+        )
+    return __read_engine
+
+
+async def warm_up_pool(engine: Optional[AsyncEngine] = None) -> None:
+    # Открываем минимальное число соединений заранее, чтобы первые запросы не ждали подключения.
+    # Соединения открываются параллельно и сразу возвращаются в пул простаивающими.
+    engine = _get_engine(engine)
+    count = min(settings.db_pool_min_size, engine.pool.size())
+    connections = await asyncio.gather(*(engine.connect() for _ in range(count)))
+    for connection in connections:
+        await connection.close()
+
+
+def pool_stats(engine: Optional[AsyncEngine] = None) -> dict:
+    pool = _get_engine(engine).pool
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool.max_overflow if isinstance(pool, TimedQueuePool) else settings.db_pool_max_overflow,
+    }
+    if isinstance(pool, TimedQueuePool):
+        stats["wait_count"] = pool.wait_count
+        stats["wait_avg_ms"] = round(pool.wait_total / pool.wait_count * 1000, 3) if pool.wait_count else 0.0
+        stats["wait_max_ms"] = round(pool.wait_max * 1000, 3)
+    return stats
 
 
 async def get_async_session() -> AsyncGenerator:
@@ -46,30 +262,106 @@ async def get_async_session() -> AsyncGenerator:
     try:
         yield session
         await session.commit()
+        await run_after_commit(session)
     except Exception as e:
         logger.error("Raises exception: %s", e)
         raise e
     finally:
+        discard_after_commit(session)
         await session.rollback()
         await session.close()
 
 
-async def create_db_and_tables():
-    from src.models.sellers import Seller
-    from src.models.books import Book
+def call_after_commit(
+    session: Union[AsyncSession, Session], callback: Callable[..., Awaitable[Any]], *args: Any
+) -> None:
+    """Откладывает callback(*args) до commit сессии из get_async_session. При откате не вызывается.
+    Из событий ORM можно передать синхронную Session: info у нее общий с AsyncSession."""
+    # Например, сброс кеша: до commit параллельный запрос успел бы положить в кеш старые данные
+    session.info.setdefault(_AFTER_COMMIT_KEY, []).append((callback, args))
 
-    global __async_engine
 
-    if __async_engine is None:
+async def run_after_commit(session: AsyncSession) -> None:
+    for callback, args in session.info.pop(_AFTER_COMMIT_KEY, []):
+        await callback(*args)
+
+
+def discard_after_commit(session: AsyncSession) -> None:
+    session.info.pop(_AFTER_COMMIT_KEY, None)
+
+
+def get_session_factory() -> Callable[[], AsyncSession]:
+    # Зависимость для кода, которому сессия нужна дольше, чем живет сам запрос.
+    # Например, StreamingResponse: зависимости с yield закрываются до отправки тела ответа,
+    # поэтому генератор ответа сам открывает и закрывает сессию из этой фабрики.
+    global __session_factory
+
+    if not __session_factory:
         raise ValueError(
             {"message": "You must call global_init() before using this method"}
         )
 
-    async with __async_engine.begin() as conn:
-        print("==================================creating tables++++++++++++++++++++++++++++++++")
-        # await conn.run_sync(BaseModel.metadata.drop_all)
-        await conn.run_sync(BaseModel.metadata.create_all)
-        print("==================================Tables created successfully++++++++++++++++++++++++++++++++")
+    return __session_factory
+
+
+async def get_async_read_session() -> AsyncGenerator:
+    # Сессия для GET-ручек. Может смотреть в реплику, поэтому писать через нее нельзя.
+    # Ручки, которым нужно прочитать только что записанное, берут get_async_session.
+    # Работает в autocommit, поэтому commit/rollback не нужны: в БД уходят только сами SELECT.
+    global __read_only_session_factory
+
+    if not __read_only_session_factory:
+        raise ValueError(
+            {"message": "You must call global_init() before using this method"}
+        )
+
+    replica = await use_replica()
+    factory = __replica_read_only_session_factory if replica else __read_only_session_factory
+    session: AsyncSession = factory()
+    session.info[_REPLICA_KEY] = replica
+
+    try:
+        yield session
+    except Exception as e:
+        logger.error("Raises exception: %s", e)
+        raise e
+    finally:
+        await session.close()
+
+
+def is_replica_session(session: AsyncSession) -> bool:
+    """Смотрит ли сессия в реплику. Прочитанное из реплики может отставать от primary."""
+    return session.info.get(_REPLICA_KEY, False)
+
+
+async def get_read_session_factory() -> Callable[[], AsyncSession]:
+    # То же, что get_session_factory, но для чтения (может вернуть фабрику реплики)
+    return await choose_read_session_factory()
+
+
+def _upgrade(connection, revision: str) -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_CONFIG_PATH)
+    config.attributes["connection"] = connection
+    command.upgrade(config, revision)
+
+
+async def migrate_db(engine: Optional[AsyncEngine] = None, revision: str = "head") -> None:
+    """Применяет миграции до revision, то же самое, что alembic upgrade head."""
+    async with _get_engine(engine).begin() as connection:
+        await connection.run_sync(_upgrade, revision)
+
+
+async def recreate_db(engine: AsyncEngine) -> None:
+    """Удаляет все таблицы и заново применяет миграции. Только для тестовой БД (тесты, бенчмарк)."""
+    from src.models import books, sellers, users  # noqa F401
+
+    async with engine.begin() as connection:
+        await connection.run_sync(BaseModel.metadata.drop_all)
+        await connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    await migrate_db(engine)
 
 
 async def delete_db_and_tables():
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,16 +10,83 @@ class Settings(BaseSettings):
     db_username: str
     db_password: str
     db_test_name: str = "fastapi_project_test_db"
-    max_connection_count: int = 10
+
+    # Реплика только для чтения. Если db_replica_host не задан, все запросы идут в основную БД.
+    db_replica_host: Optional[str] = None
+    db_replica_name: Optional[str] = None  # по умолчанию совпадает с db_name
+    db_replica_max_lag_seconds: float = 5.0  # при большем отставании чтение уходит в основную БД
+    db_replica_lag_check_interval: float = 5.0
+    # Вторая тестовая БД на db_host в роли реплики. Без нее тест чтения из реплики пропускается.
+    db_replica_test_name: Optional[str] = None
+    max_connection_count: int = 10  # постоянный размер пула соединений для записи
+
+    # Пул соединений с БД
+    db_echo: bool = False
+    db_pool_min_size: int = 5  # сколько соединений открыть заранее при старте приложения
+    db_pool_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Отдельный пул соединений только для чтения (GET-ручки), у реплики - такой же.
+    # Всего соединений с основной БД на один воркер не больше
+    # max_connection_count + db_pool_max_overflow + db_read_pool_size + db_read_pool_max_overflow.
+    db_read_pool_size: int = 5
+    db_read_pool_max_overflow: int = 5
+
+    # Применять миграции (alembic upgrade head) при старте приложения.
+    # При нескольких экземплярах лучше выключить и запускать миграции отдельным шагом деплоя.
+    db_migrate_on_startup: bool = True
+
+    # Кеш книг и продавцов по id
+    cache_max_size: int = 10000
+    cache_ttl_seconds: float = 60.0
+
+    # Кеш фасетов книг по фильтрам. Записи не сбрасываются при записи книг, поэтому ttl короткий.
+    facets_cache_max_size: int = 1000
+    facets_cache_ttl_seconds: float = 10.0
+
+    # Кеш авторизованных пользователей в get_current_user
+    principal_cache_max_size: int = 10000
+    principal_cache_ttl_seconds: float = 300.0
+    principal_negative_cache_ttl_seconds: float = 30.0
+
+    # Хеширование паролей (bcrypt) в отдельном пуле потоков
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 100
+
+    # Режим разработки: предупреждения в лог о повторяющихся запросах к БД (N+1) и превышении бюджета ручки
+    dev_mode: bool = False
+    db_repeated_query_threshold: int = 3  # с какого числа повторов одного запроса писать предупреждение
+    db_query_budget_strict: bool = False  # превышение бюджета запросов - ошибка, а не предупреждение
+
+    # Сэмплирующий профилировщик медленных запросов
+    profiler_sample_rate: float = 0.0  # доля запросов, которые профилируются сами по себе
+    profiler_header_enabled: bool = False  # разрешить включать профилирование заголовком X-Profile
+    profiler_slow_threshold_ms: float = 500.0  # профиль сохраняется, только если запрос был дольше
+    profiler_interval_ms: float = 5.0
+    profiler_output_dir: str = "profiles"
 
     @property
     def database_url(self) -> str:
         return f"postgresql+asyncpg://{self.db_username}:{self.db_password}@{self.db_host}/{self.db_name}"
 
+    @property
+    def database_replica_url(self) -> Optional[str]:
+        if not self.db_replica_host:
+            return None
+        return f"postgresql+asyncpg://{self.db_username}:{self.db_password}@{self.db_replica_host}/{self.db_replica_name or self.db_name}"
+
     @property
     def database_test_url(self) -> str:
         return f"postgresql+asyncpg://{self.db_username}:{self.db_password}@{self.db_host}/{self.db_test_name}"
 
+    @property
+    def database_replica_test_url(self) -> Optional[str]:
+        if not self.db_replica_test_name:
+            return None
+        return f"postgresql+asyncpg://{self.db_username}:{self.db_password}@{self.db_host}/{self.db_replica_test_name}"
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 
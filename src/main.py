@@ -2,8 +2,18 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
-from src.configurations.database import create_db_and_tables, global_init, delete_db_and_tables
-from src.routers import v1_router
+from src.configurations.database import (
+    delete_db_and_tables, get_engine, get_read_engine, global_init, migrate_db, warm_up_pool,
+)
+from src.configurations.settings import settings
+from src.routers import metrics_router, v1_router
+from src.services.bulk_delete import wait_bulk_delete_jobs
+from src.services.search import init_book_search
+from src.services.suggest import book_suggestions
+from src.monitoring.metrics import MetricsMiddleware
+from src.monitoring.profiling import ProfilingMiddleware
+from src.monitoring.queries import QueryChecksMiddleware
+from auth.utils import shutdown_password_hashing
 from icecream import ic
 
 
@@ -11,8 +21,16 @@ from icecream import ic
 async def lifespan(app: FastAPI):
     ic("I am here!")
     global_init()
-    await create_db_and_tables()
+    if settings.db_migrate_on_startup:
+        await migrate_db()
+    await init_book_search(get_engine())
+    await book_suggestions.rebuild(get_engine())
+    await warm_up_pool()
+    await warm_up_pool(get_read_engine())
     yield
+    # Фоновые удаления продавцов дожидаемся, а не обрываем посреди пачки
+    await wait_bulk_delete_jobs()
+    shutdown_password_hashing()
     # await delete_db_and_tables()
     # yield
 
@@ -28,4 +46,13 @@ app = FastAPI(
 )
 
 
+# Порядок важен: последнее добавленное middleware - внешнее.
+# ProfilingMiddleware (Server-Timing и профили) берет статистику запроса у MetricsMiddleware.
+# Бюджеты запросов к БД и поиск N+1, работает только в режиме разработки
+app.add_middleware(QueryChecksMiddleware)
+app.add_middleware(ProfilingMiddleware)
+# Время ответа и запросы к БД по каждой ручке, отдаются на /metrics
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(v1_router)
+app.include_router(metrics_router)
@@ -0,0 +1,67 @@
+# Окружение Alembic. Миграции запускаются двумя способами:
+# из командной строки (alembic upgrade head) - тогда движок создается здесь по настройкам приложения,
+# или из кода (src.configurations.database.migrate_db) - тогда соединение передается в config.attributes.
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.configurations.settings import settings
+from src.models import books, sellers, users  # noqa F401: регистрируем таблицы в metadata
+from src.models.base import BaseModel
+
+config = context.config
+target_metadata = BaseModel.metadata
+
+# Триграммные индексы создаются, только если в БД есть pg_trgm, в моделях их нет
+OPTIONAL_INDEXES = {"ix_books_table_title_trgm", "ix_books_table_author_trgm"}
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    return not (type_ == "index" and name in OPTIONAL_INDEXES)
+
+
+def _url() -> str:
+    return config.get_main_option("sqlalchemy.url") or settings.database_url
+
+
+def run_migrations_offline() -> None:
+    # alembic upgrade head --sql: печатает SQL вместо выполнения
+    context.configure(url=_url(), target_metadata=target_metadata, literal_binds=True, include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    engine = create_async_engine(_url(), poolclass=NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+        await connection.commit()
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+        return
+
+    # Логирование из alembic.ini настраиваем только при запуске из командной строки,
+    # иначе оно перезаписало бы настройки логов приложения
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name)
+    asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
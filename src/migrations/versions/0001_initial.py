@@ -0,0 +1,50 @@
+"""Начальная схема: продавцы, книги и пользователи.
+
+Ровно те таблицы, которые раньше создавались через create_all при старте приложения.
+Существующую БД, созданную так, достаточно пометить этой ревизией и применить остальные:
+alembic stamp 0001 && alembic upgrade head
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sellers_table",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("first_name", sa.String(50), nullable=False),
+        sa.Column("second_name", sa.String(50), nullable=False),
+        sa.Column("e_mail", sa.String(50), nullable=False),
+        sa.Column("password", sa.String(50), nullable=False),
+    )
+    op.create_table(
+        "books_table",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(50), nullable=False),
+        sa.Column("author", sa.String(100), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("pages", sa.Integer(), nullable=False),
+        sa.Column("seller_id", sa.Integer(), sa.ForeignKey("sellers_table.id", ondelete="CASCADE"), nullable=False),
+    )
+    op.create_table(
+        "users_table",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("e_mail", sa.String(), nullable=False, unique=True),
+        sa.Column("password", sa.String(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("users_table")
+    op.drop_table("books_table")
+    op.drop_table("sellers_table")
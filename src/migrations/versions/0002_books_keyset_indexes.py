@@ -0,0 +1,31 @@
+"""Индексы под keyset-пагинацию GET /books: по (ключ сортировки, id) и по продавцу.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_books_table_year_id": ["year", "id"],
+    "ix_books_table_title_id": ["title", "id"],
+    "ix_books_table_author_id": ["author", "id"],
+    "ix_books_table_seller_id_id": ["seller_id", "id"],
+    "ix_books_table_seller_id_year_id": ["seller_id", "year", "id"],
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.create_index(name, "books_table", columns)
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.drop_index(name, table_name="books_table")
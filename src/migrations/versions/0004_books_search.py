@@ -0,0 +1,56 @@
+"""Поиск книг: вычисляемая колонка search_vector с GIN-индексом и, если есть pg_trgm, триграммные индексы.
+
+search_vector для уже существующих книг PostgreSQL вычисляет сам при добавлении колонки (с перезаписью таблицы).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', author), 'B')"
+)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "books_table",
+        sa.Column("search_vector", postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR, persisted=True), nullable=False),
+    )
+    op.create_index("ix_books_table_search_vector", "books_table", ["search_vector"], postgresql_using="gin")
+    _create_trigram_indexes()
+
+
+def _create_trigram_indexes() -> None:
+    # Нечеткий поиск по триграммам необязателен: если расширение pg_trgm поставить нельзя
+    # (нет в сборке PostgreSQL или не хватает прав), откатываем только эту часть миграции
+    try:
+        with op.get_bind().begin_nested():
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            op.create_index(
+                "ix_books_table_title_trgm", "books_table", ["title"],
+                postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"},
+            )
+            op.create_index(
+                "ix_books_table_author_trgm", "books_table", ["author"],
+                postgresql_using="gin", postgresql_ops={"author": "gin_trgm_ops"},
+            )
+    except DBAPIError:
+        pass
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_books_table_author_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_books_table_title_trgm")
+    op.drop_index("ix_books_table_search_vector", table_name="books_table")
+    op.drop_column("books_table", "search_vector")
@@ -0,0 +1,25 @@
+"""Индекс по e_mail продавцов.
+
+Остальные запрошенные индексы уже есть в 0002 как составные, и их префиксы обслуживают те же запросы:
+seller_id - ix_books_table_seller_id_id, (seller_id, year) - ix_books_table_seller_id_year_id,
+author - ix_books_table_author_id.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_sellers_table_e_mail", "sellers_table", ["e_mail"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sellers_table_e_mail", table_name="sellers_table")
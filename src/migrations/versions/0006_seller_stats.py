@@ -0,0 +1,111 @@
+"""Сводная таблица статистики продавцов.
+
+seller_stats_table хранит для каждого продавца число книг, сумму страниц и самый новый год издания.
+Ее ведут триггеры на уровне оператора: они срабатывают в той же транзакции, что и запись книг,
+при любом способе записи (ORM, пакетная загрузка, импорт, каскадное удаление продавца).
+Изменения считаются по таблицам переходов (new_rows/old_rows), поэтому одна пачка на 10 000 книг -
+это один UPDATE сводки, а не 10 000. Самый новый год пересчитывается по индексу (seller_id, year, id)
+только тогда, когда удалена или изменена книга с этим годом.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# Изменения одной операции в виде строк (seller_id, книги, страницы, добавленный год, удаленный год)
+BOOKS_CHANGES = {
+    "insert": "SELECT seller_id, 1, pages, year, NULL::int FROM new_rows",
+    "delete": "SELECT seller_id, -1, -pages, NULL::int, year FROM old_rows",
+}
+BOOKS_CHANGES["update"] = BOOKS_CHANGES["insert"] + " UNION ALL " + BOOKS_CHANGES["delete"]
+
+# Таблицы переходов видны только той операции, что их объявила, поэтому у каждой операции своя функция.
+# Запрос в функции статический: PL/pgSQL кеширует его план, а EXECUTE планировал бы его на каждую запись.
+BOOKS_FUNCTION_TEMPLATE = """
+CREATE OR REPLACE FUNCTION seller_stats_on_books_{operation}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE seller_stats_table AS stats SET
+        books_count = stats.books_count + delta.books,
+        pages_total = stats.pages_total + delta.pages,
+        newest_year = CASE
+            WHEN delta.removed_year >= stats.newest_year
+                THEN (SELECT max(year) FROM books_table WHERE books_table.seller_id = stats.seller_id)
+            ELSE greatest(stats.newest_year, delta.added_year)
+        END
+    FROM (
+        SELECT seller_id, sum(books) AS books, sum(pages) AS pages,
+               max(added_year) AS added_year, max(removed_year) AS removed_year
+        FROM ({changes}) AS change (seller_id, books, pages, added_year, removed_year)
+        GROUP BY seller_id
+    ) AS delta
+    WHERE stats.seller_id = delta.seller_id
+      AND (delta.books <> 0 OR delta.pages <> 0 OR delta.added_year IS DISTINCT FROM delta.removed_year);
+    RETURN NULL;
+END
+$$
+"""
+
+CREATE_SELLERS_FUNCTION = """
+CREATE OR REPLACE FUNCTION seller_stats_on_seller_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO seller_stats_table (seller_id) SELECT id FROM new_rows;
+    RETURN NULL;
+END
+$$
+"""
+
+TRIGGERS = {
+    "insert": "AFTER INSERT ON books_table REFERENCING NEW TABLE AS new_rows",
+    "update": "AFTER UPDATE ON books_table REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "delete": "AFTER DELETE ON books_table REFERENCING OLD TABLE AS old_rows",
+}
+
+BACKFILL = """
+INSERT INTO seller_stats_table (seller_id, books_count, pages_total, newest_year)
+SELECT sellers_table.id, count(books_table.id), coalesce(sum(books_table.pages), 0), max(books_table.year)
+FROM sellers_table LEFT JOIN books_table ON books_table.seller_id = sellers_table.id
+GROUP BY sellers_table.id
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "seller_stats_table",
+        sa.Column(
+            "seller_id", sa.Integer(), sa.ForeignKey("sellers_table.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("books_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("pages_total", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("newest_year", sa.Integer(), nullable=True),
+    )
+    for operation, definition in TRIGGERS.items():
+        op.execute(BOOKS_FUNCTION_TEMPLATE.format(operation=operation, changes=BOOKS_CHANGES[operation]))
+        op.execute(
+            f"CREATE TRIGGER books_table_stats_{operation} {definition} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION seller_stats_on_books_{operation}()"
+        )
+    op.execute(CREATE_SELLERS_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER sellers_table_stats_insert AFTER INSERT ON sellers_table REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION seller_stats_on_seller_insert()"
+    )
+    # Заполняем сводку уже после создания триггеров: они блокируют запись в таблицы до конца миграции,
+    # и ни одно изменение не проскочит между подсчетом и включением триггеров
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER sellers_table_stats_insert ON sellers_table")
+    for operation in TRIGGERS:
+        op.execute(f"DROP TRIGGER books_table_stats_{operation} ON books_table")
+        op.execute(f"DROP FUNCTION seller_stats_on_books_{operation}()")
+    op.execute("DROP FUNCTION seller_stats_on_seller_insert()")
+    op.drop_table("seller_stats_table")
@@ -1,4 +1,5 @@
-from sqlalchemy import String, ForeignKey
+from sqlalchemy import Computed, String, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import BaseModel
@@ -14,3 +15,29 @@ class Book(BaseModel):
     pages: Mapped[int]
     seller_id: Mapped[int] = mapped_column(ForeignKey("sellers_table.id", ondelete="CASCADE"))
     seller: Mapped["Seller"] = relationship(back_populates="books")
+    # Версия строки: ORM увеличивает ее при каждом UPDATE и проверяет в WHERE (оптимистичная блокировка).
+    # Из версий строится ETag ответов.
+    version: Mapped[int] = mapped_column(nullable=False, server_default="1")
+    # Документ для полнотекстового поиска, название весит больше автора. Вычисляется самой БД при записи.
+    # Отложенная колонка: обычные запросы книг ее не читают.
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', author), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+
+    # Индексы под keyset-пагинацию GET /books: каждая страница - это range scan по (ключ, id),
+    # а не полный проход по таблице с сортировкой.
+    __table_args__ = (
+        Index("ix_books_table_year_id", "year", "id"),
+        Index("ix_books_table_title_id", "title", "id"),
+        Index("ix_books_table_author_id", "author", "id"),
+        Index("ix_books_table_seller_id_id", "seller_id", "id"),
+        Index("ix_books_table_seller_id_year_id", "seller_id", "year", "id"),
+        # Индекс полнотекстового поиска GET /books/search
+        Index("ix_books_table_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    __mapper_args__ = {"version_id_col": version}
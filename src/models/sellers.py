@@ -1,4 +1,6 @@
-from sqlalchemy import String
+from typing import Optional
+
+from sqlalchemy import BigInteger, ForeignKey, Index, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import BaseModel
@@ -13,6 +15,30 @@ class Seller(BaseModel):
     second_name: Mapped[str] = mapped_column(String(50), nullable=False)
     e_mail: Mapped[str] = mapped_column(String(50), nullable=False)
     password: Mapped[str] = mapped_column(String(50), nullable=False)
+    # Версия строки, как у Book: растет при каждом UPDATE, из нее строится ETag
+    version: Mapped[int] = mapped_column(nullable=False, server_default="1")
+
+    # Связь One To Many. Книги удаляет сама БД (ondelete="CASCADE" у Book.seller_id):
+    # passive_deletes не дает ORM загружать и удалять их по одной перед удалением продавца.
+    # Сами по себе книги не загружаются (lazy='raise'): запрос, которому они нужны, просит их явно
+    # через selectinload(Seller.books), а случайное обращение к незагруженным книгам - ошибка, а не лишний запрос.
+    books: Mapped[list[Book]] = relationship(
+        back_populates='seller', lazy='raise', cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    __table_args__ = (
+        Index("ix_sellers_table_e_mail", "e_mail"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+class SellerStats(BaseModel):
+    """Сводка по книгам продавца. Ее ведут триггеры БД (миграция 0006) в той же транзакции,
+    что и запись книг, приложение таблицу только читает."""
+
+    __tablename__ = "seller_stats_table"
 
-    # Связь One To Many
-    books: Mapped[list[Book]] = relationship(back_populates='seller', lazy='selectin', cascade="all, delete-orphan")
+    seller_id: Mapped[int] = mapped_column(ForeignKey("sellers_table.id", ondelete="CASCADE"), primary_key=True)
+    books_count: Mapped[int] = mapped_column(nullable=False, server_default="0")
+    pages_total: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    newest_year: Mapped[Optional[int]]
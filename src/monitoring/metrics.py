@@ -0,0 +1,221 @@
+# Метрики приложения в формате Prometheus.
+# ASGI-middleware меряет каждый запрос, а события SQLAlchemy на движке считают запросы к БД
+# и время в них. Все счетчики живут в памяти процесса и отдаются ручкой /metrics.
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+__all__ = [
+    "Histogram",
+    "MetricsMiddleware",
+    "RequestStats",
+    "current_request_stats",
+    "instrument_engine",
+    "metrics_registry",
+    "record_phase",
+]
+
+# Границы корзин гистограммы времени ответа, в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами. Квантили оцениваются интерполяцией внутри корзины."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя корзина - +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                if index == len(self.bounds):
+                    return lower  # выше последней границы точнее сказать нельзя
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+class RequestStats:
+    """Статистика одного запроса: сколько запросов к БД и сколько времени в них,
+    плюс время отдельных фаз (авторизация, сериализация ответа).
+    Запросы к БД засчитываются и во все родительские счетчики (вложенный подсчет в тестах).
+    statements - сколько раз выполнялся каждый текст запроса, ведется только если задан."""
+
+    __slots__ = ("db_queries", "db_time", "phases", "statements", "parent")
+
+    def __init__(self, parent: Optional["RequestStats"] = None):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.phases: dict[str, float] = {}
+        self.statements: Optional[Counter] = None
+        self.parent = parent
+
+
+class RouteMetrics:
+    __slots__ = ("statuses", "latency", "db_time", "db_queries", "db_queries_total", "db_time_total")
+
+    def __init__(self):
+        self.statuses: dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.db_queries = Histogram(DB_QUERIES_BUCKETS)
+        self.db_queries_total = 0
+        self.db_time_total = 0.0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+
+    def observe(self, method: str, route: str, status: int, duration: float, stats: RequestStats) -> None:
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[(method, route)] = RouteMetrics()
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.latency.observe(duration)
+        metrics.db_time.observe(stats.db_time)
+        metrics.db_queries.observe(stats.db_queries)
+        metrics.db_queries_total += stats.db_queries
+        metrics.db_time_total += stats.db_time
+
+    def clear(self) -> None:
+        self.routes.clear()
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        lines = [
+            "# TYPE http_requests_total counter",
+            "# TYPE http_request_duration_seconds histogram",
+            "# TYPE http_request_duration_quantile_seconds gauge",
+            "# TYPE http_request_db_duration_seconds histogram",
+            "# TYPE http_request_db_queries histogram",
+            "# TYPE db_queries_total counter",
+            "# TYPE db_query_duration_seconds_total counter",
+        ]
+        for (method, route), metrics in sorted(self.routes.items()):
+            labels = f'method="{method}",route="{route}"'
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(f'http_requests_total{{{labels},status="{status}"}} {count}')
+            lines.extend(_render_histogram("http_request_duration_seconds", labels, metrics.latency))
+            for q in QUANTILES:
+                lines.append(
+                    f'http_request_duration_quantile_seconds{{{labels},quantile="{q}"}} {metrics.latency.quantile(q):.6f}'
+                )
+            lines.extend(_render_histogram("http_request_db_duration_seconds", labels, metrics.db_time))
+            lines.extend(_render_histogram("http_request_db_queries", labels, metrics.db_queries))
+            lines.append(f"db_queries_total{{{labels}}} {metrics.db_queries_total}")
+            lines.append(f"db_query_duration_seconds_total{{{labels}}} {metrics.db_time_total:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(name: str, labels: str, histogram: Histogram) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+metrics_registry = MetricsRegistry()
+
+# Статистика текущего запроса. Middleware кладет сюда объект, события SQLAlchemy его пополняют.
+# SQLAlchemy выполняет синхронный код в greenlet с тем же контекстом, поэтому объект виден и там.
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def record_phase(name: str, seconds: float) -> None:
+    # Вне запроса (например, в тестах без middleware) время просто не учитывается
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.phases[name] = stats.phases.get(name, 0.0) + seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Контекст выполнения создается на каждый запрос к БД, время старта храним прямо в нем
+    context._metrics_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - context._metrics_started_at
+    while stats is not None:
+        stats.db_queries += 1
+        stats.db_time += elapsed
+        # Пачки executemany (в том числе insertmanyvalues) - это один запрос, а не повтор
+        if stats.statements is not None and not executemany:
+            stats.statements[statement] += 1
+        stats = stats.parent
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Подключает подсчет запросов к БД на движок. Повторный вызов ничего не делает."""
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Чистое ASGI-middleware: без BaseHTTPMiddleware и лишних задач на каждый запрос."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(parent=_request_stats.get())
+        token = _request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            _request_stats.reset(token)
+            # Шаблон пути, а не сам путь: иначе у каждого id будет своя метрика
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            metrics_registry.observe(scope["method"], route_path, status_code, duration, stats)
@@ -0,0 +1,206 @@
+# Разбор времени запроса по фазам и сэмплирующий профилировщик.
+# Каждый ответ получает заголовок Server-Timing: auth (JWT и пользователь), db (запросы к БД),
+# serialize (валидация и сериализация ответа pydantic) и app (все время до отправки заголовков).
+# Выборочные запросы дополнительно профилируются: фоновый поток снимает стек потока цикла событий
+# и для медленных запросов сохраняет его в файл формата collapsed stacks (flamegraph.pl, speedscope).
+import asyncio
+import functools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from src.configurations.settings import settings
+from src.monitoring.metrics import current_request_stats, record_phase
+
+__all__ = ["ProfilingMiddleware", "StackSampler", "TimedRoute"]
+
+PROFILE_HEADER = b"x-profile"
+
+# Профилируется не больше одного запроса за раз: сэмплер видит весь поток цикла событий,
+# и параллельные профили смешались бы друг с другом.
+_profiling_lock = threading.Lock()
+
+
+# Момент, когда ручка вернула результат. Список, а не значение: синхронные ручки работают в пуле потоков
+# с копией контекста, и записать в саму переменную оттуда нельзя, а в общий список - можно.
+_endpoint_returned: ContextVar[Optional[list[float]]] = ContextVar("endpoint_returned", default=None)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    # Обертка сохраняет сигнатуру (functools.wraps), поэтому зависимости и параметры FastAPI видит те же
+    if getattr(endpoint, "_timed", False):
+        return endpoint
+
+    def mark_returned() -> None:
+        if (returned := _endpoint_returned.get()) is not None:
+            returned[:] = [time.perf_counter()]
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            result = await endpoint(*args, **kwargs)
+            mark_returned()
+            return result
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            result = endpoint(*args, **kwargs)
+            mark_returned()
+            return result
+
+    timed._timed = True
+    return timed
+
+
+def _timed_response_class(response_class: type) -> type:
+    class TimedResponse(response_class):
+        # Класс ответа создается сразу после валидации и сериализации результата ручки по response_model
+        # и сам рендерит тело: от возврата из ручки до конца __init__ и есть фаза serialize
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if returned := _endpoint_returned.get():
+                record_phase("serialize", time.perf_counter() - returned[0])
+
+    TimedResponse.__name__ = TimedResponse.__qualname__ = f"Timed{response_class.__name__}"
+    return TimedResponse
+
+
+class TimedRoute(APIRoute):
+    """Маршрут, который засекает фазу serialize для Server-Timing.
+    Ручки, которые сами возвращают Response, засекают ее сами (или не сериализуют ничего)."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+        # Обертку вызывает только обработчик (через dependant); снаружи маршрут отдает исходную ручку,
+        # чтобы ее атрибуты (query_budget) и include_router работали с ней, а не с копией
+        self.endpoint = endpoint
+
+    def get_route_handler(self) -> Callable:
+        # Подменяем класс ответа только для обработчика: OpenAPI и include_router видят исходный
+        response_class = self.response_class
+        actual_class = response_class.value if isinstance(response_class, DefaultPlaceholder) else response_class
+        self.response_class = _timed_response_class(actual_class)
+        try:
+            handler = super().get_route_handler()
+        finally:
+            self.response_class = response_class
+
+        async def timed_handler(request):
+            token = _endpoint_returned.set([])
+            try:
+                return await handler(request)
+            finally:
+                _endpoint_returned.reset(token)
+
+        return timed_handler
+
+
+class StackSampler:
+    """Раз в interval секунд снимает стек заданного потока и считает одинаковые стеки."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def render(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _server_timing(stats, app_time: float) -> bytes:
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in stats.phases.items()]
+    parts.append(f'db;dur={stats.db_time * 1000:.2f};desc="{stats.db_queries} queries"')
+    parts.append(f"app;dur={app_time * 1000:.2f}")
+    return ", ".join(parts).encode()
+
+
+def _write_profile(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as profile:
+        profile.write(content)
+
+
+class ProfilingMiddleware:
+    """Добавляет Server-Timing и профилирует выборочные запросы.
+    Должно стоять внутри MetricsMiddleware: берет у него статистику текущего запроса."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _should_profile(self, scope) -> bool:
+        if settings.profiler_header_enabled and any(
+            name == PROFILE_HEADER and value == b"1" for name, value in scope["headers"]
+        ):
+            return True
+        return settings.profiler_sample_rate > 0 and random.random() < settings.profiler_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        sampler: Optional[StackSampler] = None
+        if self._should_profile(scope) and _profiling_lock.acquire(blocking=False):
+            sampler = StackSampler(threading.get_ident(), settings.profiler_interval_ms / 1000)
+            sampler.start()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                stats = current_request_stats()
+                if stats is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(stats, time.perf_counter() - started)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if sampler is not None:
+                sampler.stop()
+                _profiling_lock.release()
+                duration_ms = (time.perf_counter() - started) * 1000
+                if duration_ms >= settings.profiler_slow_threshold_ms:
+                    await self._save(scope, sampler, duration_ms)
+
+    async def _save(self, scope, sampler: StackSampler, duration_ms: float) -> None:
+        route = getattr(scope.get("route"), "path", None) or scope["path"]
+        route = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{route}-{duration_ms:.0f}ms.collapsed"
+        await run_in_threadpool(_write_profile, os.path.join(settings.profiler_output_dir, name), sampler.render())
@@ -0,0 +1,93 @@
+# Бюджеты запросов к БД и поиск N+1.
+# Ручка объявляет бюджет декоратором @query_budget(n). В режиме разработки (settings.dev_mode)
+# превышение бюджета и повторы одного и того же запроса внутри запроса к API пишутся в лог,
+# а с db_query_budget_strict превышение бюджета - ошибка (так включено в тестах).
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from src.configurations.settings import settings
+from src.monitoring.metrics import RequestStats, _request_stats, current_request_stats
+
+__all__ = [
+    "QueryBudgetExceeded",
+    "QueryChecksMiddleware",
+    "assert_max_queries",
+    "count_queries",
+    "query_budget",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries: int) -> Callable:
+    """Максимум запросов к БД для ручки. Ставится под декоратором роутера."""
+
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.query_budget = max_queries
+        return endpoint
+
+    return decorator
+
+
+@contextmanager
+def count_queries() -> Iterator[RequestStats]:
+    """Считает запросы к БД внутри блока, в том числе сделанные ручками через ASGITransport."""
+    stats = RequestStats(parent=_request_stats.get())
+    stats.statements = Counter()
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+def _describe(stats: RequestStats) -> str:
+    return "\n".join(f"  {count} x {statement}" for statement, count in stats.statements.most_common())
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[RequestStats]:
+    with count_queries() as stats:
+        yield stats
+    if stats.db_queries > max_queries:
+        raise QueryBudgetExceeded(f"{stats.db_queries} queries, expected at most {max_queries}:\n{_describe(stats)}")
+
+
+def _check_request(scope, stats: RequestStats) -> None:
+    route = scope.get("route")
+    name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+    for statement, count in stats.statements.items():
+        if count >= settings.db_repeated_query_threshold:
+            logger.warning("%s: statement executed %d times, possible N+1: %s", name, count, statement)
+
+    budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+    if budget is not None and stats.db_queries > budget:
+        message = f"{name}: {stats.db_queries} queries, budget is {budget}"
+        if settings.db_query_budget_strict:
+            raise QueryBudgetExceeded(f"{message}:\n{_describe(stats)}")
+        logger.warning(message)
+
+
+class QueryChecksMiddleware:
+    """Проверки запросов к БД в режиме разработки. Вне dev_mode просто передает запрос дальше.
+    Должно стоять внутри MetricsMiddleware: проверяет его статистику текущего запроса."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        stats = current_request_stats()
+        if scope["type"] != "http" or stats is None or not settings.dev_mode:
+            await self.app(scope, receive, send)
+            return
+
+        stats.statements = Counter()
+        await self.app(scope, receive, send)
+        _check_request(scope, stats)
@@ -3,9 +3,12 @@ from fastapi import APIRouter
 from .v1.books import books_router
 from .v1.sellers import sellers_router
 from .v1.auth import router
+from .v1.internal import internal_router
+from .metrics import metrics_router
 
 v1_router = APIRouter(tags=["v1"], prefix="/api/v1")
 
 v1_router.include_router(books_router)
 v1_router.include_router(sellers_router)
-v1_router.include_router(router)
\ No newline at end of file
+v1_router.include_router(router)
+v1_router.include_router(internal_router)
\ No newline at end of file
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.monitoring.metrics import metrics_registry
+from src.monitoring.profiling import TimedRoute
+
+metrics_router = APIRouter(tags=["internal"], route_class=TimedRoute)
+
+
+# Метрики в формате Prometheus: запросы, время ответа и запросы к БД по каждой ручке
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,32 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from auth.utils import verify_password, hash_password, create_access_token
+from auth.utils import verify_password_async, hash_password_async, create_access_token
+from auth.deps import invalidate_principal
 from src.models.users import User
 from src.schemas.auth import Token, AuthData, UserCreate
 from src.configurations.database import get_async_session
+from src.monitoring.queries import query_budget
+from src.monitoring.profiling import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post("/token", response_model=Token)
+@query_budget(3)
 async def get_or_create_token(auth_data: AuthData, session: AsyncSession = Depends(get_async_session)):
     result = await session.execute(select(User).where(User.e_mail == auth_data.e_mail))
     user = result.scalars().first()
 
     if user:
         # Проверка пароля
-        if not verify_password(auth_data.password, user.password):
+        if not await verify_password_async(auth_data.password, user.password):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
     else:
         # Регистрация нового пользователя
         user = User(
             e_mail=auth_data.e_mail,
-            password=hash_password(auth_data.password)
+            password=await hash_password_async(auth_data.password)
         )
         session.add(user)
         await session.commit()
         await session.refresh(user)
+        # На случай, если id уже попал в негативный кеш
+        await invalidate_principal(user.id)
 
     token = create_access_token({"sub": str(user.id)})
     return {"access_token": token, "token_type": "bearer"}
\ No newline at end of file
@@ -3,23 +3,60 @@
 # sys.path.append("..")
 # from main import app
 
-from typing import Annotated
-from fastapi import APIRouter, Depends, Response, status
+from typing import Annotated, Any, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import select
 from src.models.books import Book
 from src.models.sellers import Seller
 from src.models.users import User
-from src.schemas import IncomingBook, ReturnedAllbooks, ReturnedBook
-from icecream import ic
+from src.schemas import (
+    BookFilters, BookPatch, BookSort, IncomingBook, ReturnedAllbooks, ReturnedBook, ReturnedBookFacets,
+    ReturnedBooksImport, ReturnedBulkBooks, ReturnedSuggestions,
+)
+from src.services.books import (
+    BULK_INSERT_CHUNK_SIZE, books_next_cursor, books_page_query, bulk_create_books, delete_book_returning, load_book,
+    update_book_returning,
+)
+from src.services.cache import book_key, entity_cache, seller_key
+from src.services.etags import (
+    book_etag, book_version_etag, books_page_etag, check_if_match, conditional_response, etag_headers, not_modified,
+    precondition_failed,
+)
+from src.services.facets import facet_cache, facets_key, load_book_facets
+from src.services.imports import import_books_csv
+from src.services.search import search_books_query, search_next_cursor
+from src.services.suggest import book_suggestions
+from src.monitoring.queries import query_budget
+from src.monitoring.profiling import TimedRoute
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.configurations import get_async_session
+from src.configurations import call_after_commit, get_async_read_session, get_async_session, is_replica_session
 from auth.deps import get_current_user
 
-books_router = APIRouter(tags=["books"], prefix="/books")
+books_router = APIRouter(tags=["books"], prefix="/books", route_class=TimedRoute)
+# Ручки с постоянным путем (/search, /facets, /suggest) объявлены до /{book_id}, иначе путь попал бы в него.
 
 # CRUD - Create, Read, Update, Delete
 
-DBSession = Annotated[AsyncSession, Depends(get_async_session)]
+# Сессия для записи: транзакция в основной БД, commit в конце запроса
+DBWriteSession = Annotated[AsyncSession, Depends(get_async_session)]
+# Сессия для чтения: autocommit без COMMIT/ROLLBACK, может смотреть в реплику, писать через нее нельзя
+DBReadSession = Annotated[AsyncSession, Depends(get_async_read_session)]
+
+# Размер страницы списка книг
+BOOKS_PAGE_SIZE = 50
+BOOKS_PAGE_SIZE_MAX = 500
+
+# Число подсказок автодополнения
+SUGGEST_LIMIT = 10
+SUGGEST_LIMIT_MAX = 50
+
+# Сколько значений каждого фасета отдается
+FACETS_LIMIT = 20
+FACETS_LIMIT_MAX = 100
+
+# Максимальное число книг в одном запросе пакетной загрузки
+BULK_BOOKS_MAX = 10000
 
 
 # Ручка для создания записи о книге в БД. Возвращает созданную книгу.
@@ -27,12 +64,13 @@ DBSession = Annotated[AsyncSession, Depends(get_async_session)]
 @books_router.post(
     "/", response_model=ReturnedBook, status_code=status.HTTP_201_CREATED
 )  # Прописываем модель ответа
+@query_budget(2)
 async def create_book(
     book: IncomingBook,
-    session: DBSession,
+    session: DBWriteSession,
     current_user: User = Depends(get_current_user)):
   # прописываем модель валидирующую входные данные
-    # session = get_async_session() вместо этого мы используем иньекцию зависимостей DBSession
+    # session = get_async_session() вместо этого мы используем иньекцию зависимостей DBWriteSession
 
     # это - бизнес логика. Обрабатываем данные, сохраняем, преобразуем и т.д.
     new_book = Book(
@@ -47,54 +85,205 @@ async def create_book(
 
     session.add(new_book)
     await session.flush()
+    # У продавца поменялся список книг
+    call_after_commit(session, entity_cache.invalidate, seller_key(new_book.seller_id))
 
     return new_book
 
 
-# Ручка, возвращающая все книги
+# Ручка для пакетной загрузки книг. Принимает массив в формате IncomingBook.
+# Книги с ошибками не роняют весь пакет: они возвращаются в errors с индексом во входном массиве.
+@books_router.post("/bulk", response_model=ReturnedBulkBooks)
+@query_budget(2 + BULK_BOOKS_MAX // BULK_INSERT_CHUNK_SIZE)
+async def create_books_bulk(
+    books: Annotated[list[Any], Body(max_length=BULK_BOOKS_MAX)],
+    session: DBWriteSession,
+    current_user: User = Depends(get_current_user),
+):
+    created, errors = await bulk_create_books(session, books)
+    call_after_commit(session, entity_cache.invalidate, *{seller_key(book.seller_id) for book in created})
+    return {
+        "books": created,
+        "errors": [{"index": index, "errors": item_errors} for index, item_errors in errors.items()],
+    }
+
+
+# Ручка для импорта больших каталогов из CSV-файла (multipart/form-data, поле file).
+# Колонки: title, author, year, pages, seller_id. Загрузка идет через COPY, без INSERT на каждую книгу.
+@books_router.post("/import", response_model=ReturnedBooksImport)
+@query_budget(3)
+async def import_books(
+    file: UploadFile,
+    session: DBWriteSession,
+    current_user: User = Depends(get_current_user),
+):
+    result = await import_books_csv(session, file)
+    call_after_commit(session, entity_cache.invalidate, *map(seller_key, result.pop("seller_ids")))
+    return result
+
+
+# Ручка, возвращающая книги постранично (keyset-пагинация).
+# Следующая страница запрашивается с ?cursor=<next_cursor> и теми же фильтрами и сортировкой.
+# ETag страницы собирается из версий книг: неизменившаяся страница отдается как 304 без сериализации.
 @books_router.get("/", response_model=ReturnedAllbooks)
-async def get_all_books(session: DBSession):
+@query_budget(1)
+async def get_all_books(
+    request: Request,
+    response: Response,
+    session: DBReadSession,
+    filters: Annotated[BookFilters, Depends()],
+    limit: Annotated[int, Query(ge=1, le=BOOKS_PAGE_SIZE_MAX)] = BOOKS_PAGE_SIZE,
+    sort: BookSort = "id",
+    cursor: Optional[str] = None,
+):
     # Хотим видеть формат
-    # books: [{"id": 1, "title": "blabla", ...., "year": 2023},{...}]
-    query = select(Book)  # SELECT * FROM book
+    # books: [{"id": 1, "title": "blabla", ...., "year": 2023},{...}], next_cursor: "..."
+    query = books_page_query(filters, sort, limit, cursor)
     result = await session.execute(query)
     books = result.scalars().all()
-    return {"books": books}
+    page, next_cursor = books[:limit], books_next_cursor(books, sort, limit)
+
+    etag = books_page_etag(page, next_cursor)
+    if unchanged := not_modified(request, etag):
+        return unchanged
+    response.headers.update(etag_headers(etag))
+    return {"books": page, "next_cursor": next_cursor}
+
+
+# Ручка поиска книг по названию и автору: слова запроса ищутся как префиксы, лучшие совпадения первыми.
+# Ранжируются только SEARCH_MAX_CANDIDATES (1000) самых новых совпадений, более старые в выдачу не попадают.
+# Следующая страница запрашивается с ?cursor=<next_cursor> и тем же q.
+@books_router.get("/search", response_model=ReturnedAllbooks)
+@query_budget(1)
+async def search_books(
+    request: Request,
+    response: Response,
+    session: DBReadSession,
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=BOOKS_PAGE_SIZE_MAX)] = BOOKS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+):
+    query = search_books_query(q, limit, cursor)
+    rows = (await session.execute(query)).all() if query is not None else []
+    page, next_cursor = [book for book, _ in rows[:limit]], search_next_cursor(rows, q, limit)
+
+    etag = books_page_etag(page, next_cursor)
+    if unchanged := not_modified(request, etag):
+        return unchanged
+    response.headers.update(etag_headers(etag))
+    return {"books": page, "next_cursor": next_cursor}
+
 
+# Ручка фасетов: сколько книг под теми же фильтрами, что и у списка, приходится на каждый год,
+# автора и продавца (первые limit значений по числу книг). Считается одним запросом и кешируется
+# по фильтрам на facets_cache_ttl_seconds.
+@books_router.get("/facets", response_model=ReturnedBookFacets)
+@query_budget(1)
+async def get_book_facets(
+    session: DBReadSession,
+    filters: Annotated[BookFilters, Depends()],
+    limit: Annotated[int, Query(ge=1, le=FACETS_LIMIT_MAX)] = FACETS_LIMIT,
+):
+    return await facet_cache.get_or_load(facets_key(filters, limit), lambda: load_book_facets(session, filters, limit))
 
-# Ручка для получения книги по ее ИД
+
+# Ручка подсказок для поиска по мере ввода: самые частые названия и авторы с этим префиксом.
+# Отвечает из индекса в памяти, в БД не ходит.
+# Ответ собирается сразу в ORJSONResponse: валидация response_model заняла бы больше, чем сам поиск.
+@books_router.get("/suggest", response_model=ReturnedSuggestions)
+@query_budget(0)
+async def suggest_books(
+    prefix: Annotated[str, Query(min_length=1, max_length=100)],
+    limit: Annotated[int, Query(ge=1, le=SUGGEST_LIMIT_MAX)] = SUGGEST_LIMIT,
+):
+    return ORJSONResponse(book_suggestions.suggest(prefix, limit))
+
+
+# Ручка для получения книги по ее ИД. Горячие книги отдаются из кеша без похода в БД,
+# а при совпадении If-None-Match - ответом 304 без тела.
 @books_router.get("/{book_id}", response_model=ReturnedBook)
-async def get_book(book_id: int, session: DBSession):
-    if result := await session.get(Book, book_id):
-        return result
+@query_budget(1)
+async def get_book(book_id: int, request: Request, session: DBReadSession):
+    if representation := await entity_cache.get_or_load(
+        book_key(book_id), lambda: load_book(session, book_id), store=not is_replica_session(session)
+    ):
+        return conditional_response(request, representation)
 
     return Response(status_code=status.HTTP_404_NOT_FOUND)
 
 
-# Ручка для удаления книги
+# Ручка для удаления книги: один DELETE ... RETURNING, 404 - если он ничего не вернул
 @books_router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_book(book_id: int, session: DBSession):
-    deleted_book = await session.get(Book, book_id)
-    ic(deleted_book)  # Красивая и информативная замена для print. Полезна при отладке.
-    if deleted_book:
-        await session.delete(deleted_book)
+@query_budget(1)
+async def delete_book(book_id: int, session: DBWriteSession):
+    if deleted_book := await delete_book_returning(session, book_id):
+        call_after_commit(
+            session, entity_cache.invalidate, book_key(book_id), seller_key(deleted_book.seller_id)
+        )
     else:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
 
 
-# Ручка для обновления данных о книге
-@books_router.put("/{book_id}", response_model=ReturnedBook)
-async def update_book(book_id: int, new_book_data: ReturnedBook, session: DBSession, current_user: User = Depends(get_current_user)):
-    # Оператор "морж", позволяющий одновременно и присвоить значение и проверить его. Заменяет то, что закомментировано выше.
-    if updated_book := await session.get(Book, book_id):
-        updated_book.author = new_book_data.author
-        updated_book.title = new_book_data.title
-        updated_book.year = new_book_data.year
-        updated_book.pages = new_book_data.pages
-        updated_book.seller_id = new_book_data.seller_id
+async def _if_match_version(request: Request, session: AsyncSession, book_id: int) -> Optional[int]:
+    # ETag непрозрачный, версию из него не достать: с If-Match сначала читаем текущую версию книги.
+    # Без If-Match запись обходится одним UPDATE.
+    if "if-match" not in request.headers:
+        return None
+    version = await session.scalar(select(Book.version).where(Book.id == book_id))
+    if version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
+    check_if_match(request, book_version_etag(book_id, version))
+    return version
 
-        await session.flush()
 
-        return updated_book
+async def _update_book(
+    book_id: int, values: dict[str, Any], request: Request, response: Response, session: AsyncSession
+) -> Any:
+    version = await _if_match_version(request, session, book_id)
+    updated_book = await update_book_returning(session, book_id, values, version)
+    if updated_book is None:
+        # С If-Match пустой RETURNING значит, что книгу успели изменить после проверки версии
+        if version is not None:
+            raise precondition_failed()
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
 
-    return Response(status_code=status.HTTP_404_NOT_FOUND)
+    # Книга могла перейти к другому продавцу: сбрасываем кеш и старого, и нового
+    call_after_commit(
+        session, entity_cache.invalidate,
+        book_key(book_id), seller_key(updated_book.old_seller_id), seller_key(updated_book.seller_id),
+    )
+    response.headers.update(etag_headers(book_etag(updated_book)))
+    return updated_book
+
+
+# Ручка для обновления данных о книге одним UPDATE ... RETURNING.
+# С заголовком If-Match обновляет, только если книга не менялась.
+@books_router.put("/{book_id}", response_model=ReturnedBook)
+@query_budget(3)  # пользователь, версия для If-Match и сам UPDATE
+async def update_book(
+    book_id: int,
+    new_book_data: ReturnedBook,
+    request: Request,
+    response: Response,
+    session: DBWriteSession,
+    current_user: User = Depends(get_current_user),
+):
+    values = new_book_data.model_dump(include={"title", "author", "year", "pages", "seller_id"})
+    return await _update_book(book_id, values, request, response, session)
+
+
+# Ручка частичного обновления книги: меняются только переданные поля. If-Match - как у PUT.
+@books_router.patch("/{book_id}", response_model=ReturnedBook)
+@query_budget(3)
+async def patch_book(
+    book_id: int,
+    book_patch: BookPatch,
+    request: Request,
+    response: Response,
+    session: DBWriteSession,
+    current_user: User = Depends(get_current_user),
+):
+    values = book_patch.model_dump(exclude_unset=True, exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Nothing to update")
+    return await _update_book(book_id, values, request, response, session)
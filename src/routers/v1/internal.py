@@ -0,0 +1,32 @@
+# Служебные ручки для эксплуатации: состояние кешей и т.п. Не для клиентов API.
+from fastapi import APIRouter
+
+from auth.utils import password_hashing_stats
+from src.configurations.database import get_read_engine, pool_stats
+from src.services.cache import entity_cache
+from src.monitoring.queries import query_budget
+from src.monitoring.profiling import TimedRoute
+
+internal_router = APIRouter(tags=["internal"], prefix="/internal", route_class=TimedRoute)
+
+
+# Счетчики попаданий и промахов кеша книг и продавцов
+@internal_router.get("/cache")
+@query_budget(0)
+async def get_cache_stats():
+    return entity_cache.stats()
+
+
+# Загрузка пула хеширования паролей: сколько хешей считается и сколько ждет в очереди
+@internal_router.get("/password-hashing")
+@query_budget(0)
+async def get_password_hashing_stats():
+    return password_hashing_stats()
+
+
+# Состояние пула соединений с БД: занятые и свободные соединения, overflow и время ожидания.
+# В read - отдельный пул только для чтения, через который работают GET-ручки.
+@internal_router.get("/pool")
+@query_budget(0)
+async def get_pool_stats():
+    return {**pool_stats(), "read": pool_stats(get_read_engine())}
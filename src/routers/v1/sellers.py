@@ -3,112 +3,261 @@
 # sys.path.append("..")
 # from main import app
 
-from typing import Annotated
-from fastapi import APIRouter, Depends, Response, status
+from typing import Annotated, Callable, Literal, Optional, Union
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
-from src.models.sellers import Seller
+from src.models.sellers import SellerStats
 from src.models.users import User
-from src.schemas import IncomingSeller, ReturnedAllsellers, ReturnedSeller, SellerUpdate
-from icecream import ic
+from src.schemas import (
+    BookSort, BulkDeleteSellers, IncomingSeller, ReturnedAllSellerStats, ReturnedAllSellerSummaries, ReturnedAllsellers,
+    ReturnedBulkDeleteJob, ReturnedSeller, ReturnedSellerStats, ReturnedSellerSummary, SellerUpdate,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.configurations import get_async_session
-from sqlalchemy.orm import selectinload
+from src.configurations import (
+    call_after_commit,
+    get_async_read_session,
+    get_async_session,
+    get_read_session_factory,
+    get_session_factory,
+    is_replica_session,
+)
+from src.services.cache import book_key, entity_cache, seller_key, seller_summary_key
+from src.services.etags import (
+    Representation, check_if_match, conditional_response, etag_headers, not_modified, precondition_failed,
+    seller_summary_etag, seller_version_etag, sellers_etag, sellers_summary_etag,
+)
+from src.services.export import EXPORT_MEDIA_TYPES, stream_sellers_export
+from src.services.bulk_delete import get_bulk_delete_job, start_bulk_delete
+from src.services.sellers import (
+    create_seller_returning, delete_sellers_returning, load_seller, load_seller_etag, load_seller_summaries,
+    load_seller_summary, sellers_with_books_query, update_seller_returning,
+)
+from src.monitoring.queries import query_budget
+from src.monitoring.profiling import TimedRoute
 from fastapi import HTTPException
 from auth.deps import get_current_user
 
-sellers_router = APIRouter(tags=["sellers"], prefix="/sellers")
+sellers_router = APIRouter(tags=["sellers"], prefix="/sellers", route_class=TimedRoute)
+# Ручки с постоянным путем (/export, /stats, /bulk-delete) объявлены до /{seller_id}, иначе путь попал бы в него.
 
 # CRUD - Create, Read, Update, Delete
 
-DBSession = Annotated[AsyncSession, Depends(get_async_session)]
+# Сессия для записи: транзакция в основной БД, commit в конце запроса
+DBWriteSession = Annotated[AsyncSession, Depends(get_async_session)]
+# Сессия для чтения: autocommit без COMMIT/ROLLBACK, может смотреть в реплику, писать через нее нельзя.
+# Фабрика для стриминга: транзакционная (серверному курсору нужна транзакция).
+DBReadSession = Annotated[AsyncSession, Depends(get_async_read_session)]
+ReadSessionFactory = Annotated[Callable[[], AsyncSession], Depends(get_read_session_factory)]
+# ?include=books: отдавать продавцов вместе с книгами. Без него - только поля продавца,
+# без второго запроса за книгами и без загрузки их объектов
+IncludeBooks = Annotated[Optional[Literal["books"]], Query()]
+# Фабрика для фоновых задач записи: они живут дольше запроса и сами открывают сессии
+WriteSessionFactory = Annotated[Callable[[], AsyncSession], Depends(get_session_factory)]
+
+# Сколько продавцов можно запросить в GET /sellers/stats за раз
+SELLER_STATS_IDS_MAX = 1000
+# Наибольший books_limit в GET /sellers
+SELLER_BOOKS_LIMIT_MAX = 100
+# Сводку только читают, поэтому выбираем строки таблицы без ORM-объектов и identity map
+SELLER_STATS_TABLE = SellerStats.__table__
 
 
 # Ручка для создания записи о продавце в БД. Возвращает созданного продавца.
+# Один INSERT ... RETURNING: у нового продавца книг нет, поэтому и читать их незачем.
 # @sellers_router.post("/sellers/", status_code=status.HTTP_201_CREATED)
 @sellers_router.post(
     "/", response_model=ReturnedSeller, status_code=status.HTTP_201_CREATED
 )  # Прописываем модель ответа
+@query_budget(1)
 async def create_seller(
     seller: IncomingSeller,
-    session: DBSession,
+    session: DBWriteSession,
 ):  # прописываем модель валидирующую входные данные
-    # session = get_async_session() вместо этого мы используем иньекцию зависимостей DBSession
+    # session = get_async_session() вместо этого мы используем иньекцию зависимостей DBWriteSession
 
     # это - бизнес логика. Обрабатываем данные, сохраняем, преобразуем и т.д.
-    new_seller = Seller(
-        **{
-            "first_name": seller.first_name,
-            "second_name": seller.second_name,
-            "e_mail": seller.e_mail,
-            "password": seller.password
-        }
+    new_seller = await create_seller_returning(
+        session, seller.model_dump(include={"first_name", "second_name", "e_mail", "password"})
     )
+    return {**new_seller._mapping, "books": []}
 
-    session.add(new_seller)
-    await session.flush()
-    await session.refresh(new_seller)
 
-    # повторно получаем объект, чтобы подгрузить books
-    result = await session.execute(
-        select(Seller).options(selectinload(Seller.books)).where(Seller.id == new_seller.id)
-    )
-    full_seller = result.scalar_one()
+# Ручка, возвращающая всех продавцов, с ?include=books - вместе с книгами и их общим числом (books_total).
+# books_limit оставляет у каждого продавца только первые книги в порядке books_order,
+# так что размер ответа ограничен числом продавцов, а не размером каталога.
+@sellers_router.get("/", response_model=Union[ReturnedAllsellers, ReturnedAllSellerSummaries])
+@query_budget(1)
+async def get_all_sellers(
+    request: Request,
+    session: DBReadSession,
+    include: IncludeBooks = None,
+    books_limit: Annotated[Optional[int], Query(ge=0, le=SELLER_BOOKS_LIMIT_MAX)] = None,
+    books_order: Optional[BookSort] = None,
+):
+    if include == "books":
+        result = await session.execute(sellers_with_books_query(books_limit, books_order or "id"))
+        sellers = result.all()
+        etag, model = sellers_etag(sellers), ReturnedAllsellers
+    elif books_limit is not None or books_order is not None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="books_limit and books_order require include=books"
+        )
+    else:
+        sellers = await load_seller_summaries(session)
+        etag, model = sellers_summary_etag(sellers), ReturnedAllSellerSummaries
 
-    return full_seller
+    if unchanged := not_modified(request, etag):
+        return unchanged
+    # Модель ответа зависит от include, поэтому тело собираем сами, а не через response_model
+    representation = Representation.build(etag, model.model_validate({"sellers": sellers}, from_attributes=True))
+    return Response(content=representation.body, media_type="application/json", headers=etag_headers(etag))
 
+# Ручка для потоковой выгрузки всех продавцов с книгами (для ночных синхронизаций).
+# ndjson - один продавец с книгами на строку, csv - одна строка на пару продавец/книга.
+@sellers_router.get("/export", response_class=StreamingResponse)
+@query_budget(1)
+async def export_sellers(
+    session_factory: ReadSessionFactory,
+    export_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+):
+    return StreamingResponse(
+        stream_sellers_export(session_factory, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+    )
 
 
-# Ручка, возвращающая всех продавцов с книгами
-@sellers_router.get("/", response_model=ReturnedAllsellers)
-async def get_all_sellers(session: DBSession):
-    query = select(Seller).options(selectinload(Seller.books))
+# Ручка статистики нескольких продавцов: ?ids=1&ids=2, без ids - все продавцы.
+# Читает готовую сводку seller_stats_table (ее ведут триггеры БД), а не считает GROUP BY по книгам.
+@sellers_router.get("/stats", response_model=ReturnedAllSellerStats)
+@query_budget(1)
+async def get_sellers_stats(
+    session: DBReadSession,
+    ids: Annotated[Optional[list[int]], Query(max_length=SELLER_STATS_IDS_MAX)] = None,
+):
+    query = select(SELLER_STATS_TABLE).order_by(SELLER_STATS_TABLE.c.seller_id)
+    if ids:
+        query = query.where(SELLER_STATS_TABLE.c.seller_id.in_(ids))
     result = await session.execute(query)
-    sellers = result.scalars().all()
-    return {"sellers": sellers}
+    return {"stats": result.all()}
+
+
+# Ручка для удаления многих продавцов за раз. Удаление идет в фоне, ручка сразу отвечает 202
+# с задачей, а ее состояние отдает GET /sellers/bulk-delete/{job_id} (ссылка в заголовке Location).
+# Задачи живут в памяти процесса, который их создал: при нескольких воркерах uvicorn/gunicorn запрос состояния,
+# попавший на другой воркер, получит 404, а после перезапуска задачи и их состояние теряются.
+@sellers_router.post(
+    "/bulk-delete", response_model=ReturnedBulkDeleteJob, status_code=status.HTTP_202_ACCEPTED
+)
+@query_budget(1)  # пользователь
+async def bulk_delete_sellers(
+    payload: BulkDeleteSellers,
+    request: Request,
+    response: Response,
+    session_factory: WriteSessionFactory,
+    current_user: User = Depends(get_current_user),
+):
+    job = start_bulk_delete(session_factory, payload.ids)
+    response.headers["Location"] = str(request.url_for("get_bulk_delete_job_status", job_id=job.job_id))
+    return job
+
+
+# Ручка состояния фоновой задачи удаления продавцов
+@sellers_router.get("/bulk-delete/{job_id}", response_model=ReturnedBulkDeleteJob)
+@query_budget(0)
+async def get_bulk_delete_job_status(job_id: str):
+    if job := get_bulk_delete_job(job_id):
+        return job
+
+    return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+
+# Ручка, возвращающая одного продавца, с ?include=books - вместе с книгами. Горячие продавцы отдаются из кеша
+# без похода в БД, а при совпадении If-None-Match - ответом 304 без тела.
+@sellers_router.get("/{seller_id}", response_model=Union[ReturnedSeller, ReturnedSellerSummary])
+@query_budget(3)
+async def get_seller(
+    seller_id: int,
+    request: Request,
+    session: DBReadSession,
+    include: IncludeBooks = None,
+    current_user: User = Depends(get_current_user),
+):
+    if include == "books":
+        key, load = seller_key(seller_id), load_seller
+    else:
+        key, load = seller_summary_key(seller_id), load_seller_summary
+    if representation := await entity_cache.get_or_load(
+        key, lambda: load(session, seller_id), store=not is_replica_session(session)
+    ):
+        return conditional_response(request, representation)
+
+    return Response(status_code=status.HTTP_404_NOT_FOUND)
 
-# Ручка, возвращающая одного продавца с книгами
-@sellers_router.get("/{seller_id}", response_model=ReturnedSeller)
-async def get_seller(seller_id: int, session: DBSession, current_user: User = Depends(get_current_user)):
-    query = select(Seller).options(selectinload(Seller.books)).where(Seller.id == seller_id)
-    result = await session.execute(query)
-    seller = result.scalar_one_or_none()
 
-    if seller:
-        return seller
+# Ручка статистики одного продавца: одна строка сводки по первичному ключу
+@sellers_router.get("/{seller_id}/stats", response_model=ReturnedSellerStats)
+@query_budget(1)
+async def get_seller_stats(seller_id: int, session: DBReadSession):
+    result = await session.execute(select(SELLER_STATS_TABLE).where(SELLER_STATS_TABLE.c.seller_id == seller_id))
+    if stats := result.first():
+        return stats
 
     return Response(status_code=status.HTTP_404_NOT_FOUND)
 
 
-# Ручка для удаления книги
+# Ручка для удаления продавца одним DELETE ... RETURNING. Книги удаляет БД каскадом по внешнему ключу,
+# их id приходят в той же строке и нужны только для сброса кеша.
 @sellers_router.delete("/{seller_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_seller(seller_id: int, session: DBSession):
-    deleted_seller = await session.get(Seller, seller_id)
-    ic(deleted_seller)  # Красивая и информативная замена для print. Полезна при отладке.
-    if deleted_seller:
-        await session.delete(deleted_seller)
+@query_budget(1)
+async def delete_seller(seller_id: int, session: DBWriteSession):
+    deleted_sellers = await delete_sellers_returning(session, [seller_id])
+    if deleted_sellers:
+        (deleted_seller,) = deleted_sellers
+        call_after_commit(
+            session, entity_cache.invalidate,
+            seller_key(seller_id), seller_summary_key(seller_id), *(book_key(book["id"]) for book in deleted_seller.books),
+        )
     else:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
 
 
-# Ручка для обновления данных о книге
-@sellers_router.put("/{seller_id}", response_model=ReturnedSeller)
-async def update_seller(seller_id: int, new_seller_data: SellerUpdate, session: DBSession):
-    result = await session.execute(
-        select(Seller).options(selectinload(Seller.books)).where(Seller.id == seller_id)
-    )
-    updated_seller = result.scalar_one_or_none()
+# Ручка для обновления данных о продавце одним UPDATE ... RETURNING. Как и в GET, с ?include=books
+# отвечает вместе с книгами (они приходят в той же строке), без него книги не читает.
+# С заголовком If-Match обновляет, только если продавец не менялся.
+@sellers_router.put("/{seller_id}", response_model=Union[ReturnedSeller, ReturnedSellerSummary])
+@query_budget(2)  # версия для If-Match и сам UPDATE
+async def update_seller(
+    seller_id: int,
+    new_seller_data: SellerUpdate,
+    request: Request,
+    response: Response,
+    session: DBWriteSession,
+    include: IncludeBooks = None,
+):
+    # ETag непрозрачный, версию из него не достать: с If-Match сначала читаем текущую версию продавца
+    version = None
+    if "if-match" in request.headers:
+        if (current := await load_seller_etag(session, seller_id)) is None:
+            raise HTTPException(status_code=404, detail="Seller not found")
+        version, etag = current
+        # Клиент мог видеть продавца как с книгами, так и без них
+        check_if_match(request, etag, seller_summary_etag(seller_id, version))
 
+    values = new_seller_data.model_dump(exclude_none=True)
+    updated_seller = await update_seller_returning(session, seller_id, values, version, include_books=include == "books")
     if updated_seller is None:
+        # С If-Match пустой RETURNING значит, что продавца успели изменить после проверки версии
+        if version is not None:
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="Seller not found")
 
-    if new_seller_data.first_name is not None:
-        updated_seller.first_name = new_seller_data.first_name
-    if new_seller_data.second_name is not None:
-        updated_seller.second_name = new_seller_data.second_name
-    if new_seller_data.e_mail is not None:
-        updated_seller.e_mail = new_seller_data.e_mail
-
-    await session.flush()
-    await session.refresh(updated_seller)
+    call_after_commit(session, entity_cache.invalidate, seller_key(seller_id), seller_summary_key(seller_id))
+    if include == "books":
+        book_versions = [(book["id"], book["version"]) for book in updated_seller.books]
+        etag = seller_version_etag(seller_id, updated_seller.version, book_versions)
+    else:
+        etag = seller_summary_etag(seller_id, updated_seller.version)
+    response.headers.update(etag_headers(etag))
 
-    return updated_seller  # FastAPI теперь сможет корректно сериализовать с books
\ No newline at end of file
+    return updated_seller
@@ -1,7 +1,13 @@
+from typing import Literal, Optional
+
 from pydantic import BaseModel, Field, field_validator,ConfigDict
 from pydantic_core import PydanticCustomError
 
-__all__ = ["IncomingBook", "ReturnedBook", "ReturnedAllbooks"]
+__all__ = [
+    "IncomingBook", "ReturnedBook", "ReturnedAllbooks", "BookFilters", "BookSort",
+    "BulkBookError", "ReturnedBulkBooks", "ReturnedBooksImport", "ReturnedSuggestions",
+    "FacetCount", "ReturnedBookFacets", "BookPatch",
+]
 
 
 # Базовый класс "Книги", содержащий поля, которые есть во всех классах-наследниках.
@@ -36,11 +42,86 @@ class ReturnedBook(BaseBook):
     seller_id: int
 
 
-# Класс для возврата массива объектов "Книга"
+# Частичное изменение книги (PATCH): меняются только переданные поля
+class BookPatch(BaseModel):
+    title: Optional[str] = None
+    author: Optional[str] = None
+    year: Optional[int] = None
+    pages: Optional[int] = None
+    seller_id: Optional[int] = None
+
+    @field_validator("year")  # Та же проверка года, что у IncomingBook, если год передан
+    @staticmethod
+    def validate_year(val: Optional[int]):
+        if val is not None and val < 2020:
+            raise PydanticCustomError("Validation error", "Year is too old!")
+
+        return val
+
+
+# Класс для возврата массива объектов "Книга".
+# next_cursor - непрозрачный курсор следующей страницы, None если страница последняя.
 class ReturnedAllbooks(BaseModel):
     books: list[ReturnedBook]
+    next_cursor: Optional[str] = None
+
+
+# Допустимые ключи сортировки списка книг. Минус в начале - сортировка по убыванию.
+# Внутри одинаковых значений порядок всегда добивается по id, поэтому он стабилен.
+BookSort = Literal["id", "-id", "year", "-year", "title", "-title", "author", "-author"]
+
+
+# Фильтры списка книг. Передаются как query-параметры: ?seller_id=1&year_from=2020
+class BookFilters(BaseModel):
+    seller_id: Optional[int] = None
+    author: Optional[str] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+# Ошибка валидации одного элемента пакетной загрузки. index - позиция книги во входном массиве.
+class BulkBookError(BaseModel):
+    index: int
+    errors: list[dict]
+
+
+# Результат пакетной загрузки: созданные книги и ошибки по тем, что не прошли.
+class ReturnedBulkBooks(BaseModel):
+    books: list[ReturnedBook]
+    errors: list[BulkBookError]
+
+
+# Результат импорта CSV-файла с книгами.
+# rejected - все строки, которые не попали в таблицу: с ошибками валидации и с несуществующим продавцом.
+# errors - первые ошибки валидации, index - номер строки с данными в файле (с единицы).
+class ReturnedBooksImport(BaseModel):
+    received: int
+    inserted: int
+    rejected: int
+    errors: list[BulkBookError]
+
+
+# Подсказки для автодополнения: названия и авторы, начинающиеся с введенного префикса.
+class ReturnedSuggestions(BaseModel):
+    titles: list[str]
+    authors: list[str]
+
 
 class BookRead(BaseModel):
     id: int
     title: str
     model_config = ConfigDict(from_attributes=True)
+
+
+# Одно значение фасета и число книг с ним
+class FacetCount(BaseModel):
+    value: int | str
+    count: int
+
+
+# Фасеты списка книг: самые частые годы, авторы и продавцы среди книг под фильтрами.
+# total - сколько всего книг подходит под фильтры.
+class ReturnedBookFacets(BaseModel):
+    total: int
+    year: list[FacetCount]
+    author: list[FacetCount]
+    seller_id: list[FacetCount]
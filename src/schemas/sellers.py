@@ -1,9 +1,15 @@
 from pydantic import BaseModel, Field, field_validator, EmailStr, ConfigDict
 from pydantic_core import PydanticCustomError
-from typing import Optional, List
+from typing import Literal, Optional, List
 from .books import BookRead
 
-__all__ = ["IncomingSeller", "ReturnedSeller", "ReturnedAllsellers", "SellerUpdate"]
+__all__ = [
+    "IncomingSeller", "ReturnedSellerSummary", "ReturnedSeller", "ReturnedListedSeller", "ReturnedAllsellers", "ReturnedAllSellerSummaries", "SellerUpdate", "ReturnedSellerStats", "ReturnedAllSellerStats",
+    "BulkDeleteSellers", "ReturnedBulkDeleteJob",
+]
+
+# Сколько продавцов можно удалить одной задачей POST /sellers/bulk-delete
+SELLERS_BULK_DELETE_IDS_MAX = 10000
 
 
 # Базовый класс "Продавцы", содержащий поля, которые есть во всех классах-наследниках.
@@ -45,15 +51,58 @@ class IncomingSeller(BaseSeller):
         return val
 
 # Класс, валидирующий исходящие данные. Он уже содержит id
-class ReturnedSeller(BaseSeller):
+class ReturnedSellerSummary(BaseSeller):
     id: int
     e_mail: str
+
+
+# Продавец вместе с книгами (ручки с ?include=books)
+class ReturnedSeller(ReturnedSellerSummary):
     books: list[ReturnedBook]
 
 
+# Продавец в списке GET /sellers?include=books: books может быть урезан books_limit,
+# а books_total - сколько книг у продавца всего
+class ReturnedListedSeller(ReturnedSeller):
+    books_total: int
+
+
 # Класс для возврата массива объектов "Книга"
 class ReturnedAllsellers(BaseModel):
-    sellers: list[ReturnedSeller]
+    sellers: list[ReturnedListedSeller]
+
+
+# Класс для возврата списка продавцов без книг
+class ReturnedAllSellerSummaries(BaseModel):
+    sellers: list[ReturnedSellerSummary]
+
+
+# Статистика продавца: число книг, сумма страниц и год самой новой книги (None, если книг нет)
+class ReturnedSellerStats(BaseModel):
+    seller_id: int
+    books_count: int
+    pages_total: int
+    newest_year: Optional[int] = None
+
+
+# Класс для возврата статистики нескольких продавцов
+class ReturnedAllSellerStats(BaseModel):
+    stats: list[ReturnedSellerStats]
+
+
+# Класс для запроса на удаление многих продавцов за раз
+class BulkDeleteSellers(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=SELLERS_BULK_DELETE_IDS_MAX)
+
+
+# Состояние фоновой задачи удаления продавцов. Продавцы, которых уже не было, в sellers_deleted не входят.
+class ReturnedBulkDeleteJob(BaseModel):
+    job_id: str
+    status: Literal["pending", "running", "done", "failed"]
+    sellers_total: int
+    sellers_deleted: int
+    books_deleted: int
+    error: Optional[str] = None
 
 
 class SellerUpdate(BaseModel):
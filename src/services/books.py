@@ -0,0 +1,181 @@
+# Построение запросов к books_table, общих для нескольких ручек.
+from typing import Any, Optional
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import Row, Select, delete, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.schemas import BookFilters, IncomingBook, ReturnedBook
+from src.services.etags import Representation, book_etag
+from src.services.pagination import decode_cursor, encode_cursor
+from src.services.suggest import record_books_added, record_books_removed
+
+__all__ = [
+    "apply_book_filters", "book_order_by", "books_page_query", "books_next_cursor",
+    "validate_incoming_books", "bulk_create_books", "load_book", "update_book_returning", "delete_book_returning",
+]
+
+# Сколько книг уходит в один INSERT ... RETURNING при пакетной загрузке
+BULK_INSERT_CHUNK_SIZE = 1000
+
+# Схема валидации строится один раз при импорте, а не на каждый запрос
+_incoming_books_adapter = TypeAdapter(list[IncomingBook])
+
+# Колонки, по которым разрешена сортировка. Для каждой на модели Book объявлен индекс (col, id).
+BOOK_SORT_COLUMNS = {
+    "id": Book.id,
+    "year": Book.year,
+    "title": Book.title,
+    "author": Book.author,
+}
+
+
+def apply_book_filters(query: Select, filters: BookFilters) -> Select:
+    if filters.seller_id is not None:
+        query = query.where(Book.seller_id == filters.seller_id)
+    if filters.author is not None:
+        query = query.where(Book.author == filters.author)
+    if filters.year_from is not None:
+        query = query.where(Book.year >= filters.year_from)
+    if filters.year_to is not None:
+        query = query.where(Book.year <= filters.year_to)
+    return query
+
+
+def _sort_keys(sort: str) -> list:
+    column = BOOK_SORT_COLUMNS[sort.lstrip("-")]
+    # Сортировка по id уже уникальна, добивать ее не нужно
+    return [column] if column is Book.id else [column, Book.id]
+
+
+def book_order_by(sort: str) -> list:
+    """ORDER BY для сортировки вида "year" (по возрастанию) или "-year" (по убыванию)."""
+    descending = sort.startswith("-")
+    return [key.desc() if descending else key.asc() for key in _sort_keys(sort)]
+
+
+def books_page_query(
+    filters: BookFilters, sort: str, limit: int, cursor: Optional[str] = None
+) -> Select:
+    """Запрос одной страницы книг. Выбирает limit + 1 строку, чтобы понять, есть ли следующая."""
+    keys = _sort_keys(sort)
+    descending = sort.startswith("-")
+    query = apply_book_filters(select(Book), filters)
+
+    if cursor is not None:
+        values = decode_cursor(cursor, sort, tuple(key.type.python_type for key in keys))
+        # Сравнение кортежей (year, id) > (:year, :id) Postgres умеет отдавать в index range scan
+        position, last = tuple_(*keys), tuple_(*values)
+        query = query.where(position < last if descending else position > last)
+
+    return query.order_by(*book_order_by(sort)).limit(limit + 1)
+
+
+def books_next_cursor(books: list[Book], sort: str, limit: int) -> Optional[str]:
+    """Курсор следующей страницы. Лишнюю (limit + 1)-ю книгу вызывающий код отбрасывает сам."""
+    if len(books) <= limit:
+        return None
+    last = books[limit - 1]
+    return encode_cursor(sort, [getattr(last, key.key) for key in _sort_keys(sort)])
+
+
+def validate_incoming_books(payload: list[Any]) -> tuple[list[tuple[int, IncomingBook]], dict[int, list[dict]]]:
+    """Валидирует весь массив разом. Возвращает валидные книги с их индексами и ошибки по индексам."""
+    try:
+        return list(enumerate(_incoming_books_adapter.validate_python(payload))), {}
+    except ValidationError as exc:
+        errors: dict[int, list[dict]] = {}
+        for error in exc.errors(include_url=False, include_context=False, include_input=False):
+            index, *loc = error["loc"]
+            errors.setdefault(index, []).append({"loc": loc, "msg": error["msg"], "type": error["type"]})
+
+    # Медленный путь только для пакетов с ошибками: повторно валидируем оставшиеся элементы
+    valid_indexes = [index for index in range(len(payload)) if index not in errors]
+    books = _incoming_books_adapter.validate_python([payload[index] for index in valid_indexes])
+    return list(zip(valid_indexes, books)), errors
+
+
+async def bulk_create_books(session: AsyncSession, payload: list[Any]) -> tuple[list[Book], dict[int, list[dict]]]:
+    """Создает книги пачками. Невалидные элементы и книги несуществующих продавцов в ошибках."""
+    books, errors = validate_incoming_books(payload)
+
+    # Один запрос на проверку всех продавцов, иначе одна битая ссылка уронит весь INSERT
+    seller_ids = {book.seller_id for _, book in books}
+    existing = set()
+    if seller_ids:
+        existing = set(await session.scalars(select(Seller.id).where(Seller.id.in_(seller_ids))))
+    for index, book in books:
+        if book.seller_id not in existing:
+            errors[index] = [{"loc": ["seller_id"], "msg": "Seller not found", "type": "not_found"}]
+    rows = [book.model_dump() for index, book in books if index not in errors]
+
+    created: list[Book] = []
+    for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+        # Драйвер делит executemany на пачки insertmanyvalues, и без sort_by_parameter_order
+        # строки RETURNING могут прийти не в порядке входного массива
+        result = await session.scalars(
+            insert(Book).returning(Book, sort_by_parameter_order=True), rows[start:start + BULK_INSERT_CHUNK_SIZE]
+        )
+        created.extend(result.all())
+    record_books_added(session, ((book.title, book.author) for book in created))
+
+    return created, dict(sorted(errors.items()))
+
+
+async def load_book(session: AsyncSession, book_id: int) -> Optional[Representation]:
+    """Книга в виде готового ответа ReturnedBook с ETag. Такие объекты и лежат в кеше."""
+    if book := await session.get(Book, book_id):
+        return Representation.build(book_etag(book), ReturnedBook.model_validate(book, from_attributes=True))
+    return None
+
+
+async def update_book_returning(
+    session: AsyncSession, book_id: int, values: dict[str, Any], version: Optional[int] = None
+) -> Optional[Row]:
+    """Изменяет книгу одним UPDATE ... RETURNING и увеличивает ее версию.
+    Возвращает новую строку книги и прежние seller_id, title и author (old_seller_id, old_title, old_author).
+    None, если книги нет или ее версия уже не равна version."""
+    # Прежние значения нужны для сброса кеша прежнего продавца и для подсказок. Подзапрос читает их
+    # из той же строки с блокировкой, поэтому параллельная запись не вклинится между чтением и UPDATE.
+    old = (
+        select(Book.id, Book.seller_id, Book.title, Book.author, Book.version)
+        .where(Book.id == book_id)
+        .with_for_update()
+        .subquery("old")
+    )
+    query = (
+        update(Book)
+        .where(Book.id == old.c.id)
+        .values(**values, version=Book.version + 1)
+        .returning(
+            Book.id, Book.title, Book.author, Book.year, Book.pages, Book.seller_id, Book.version,
+            old.c.seller_id.label("old_seller_id"), old.c.title.label("old_title"), old.c.author.label("old_author"),
+        )
+        # Объекты книги, уже загруженные в сессию, обновляются по RETURNING, без отдельного SELECT
+        .execution_options(synchronize_session="fetch")
+    )
+    if version is not None:
+        query = query.where(old.c.version == version)
+
+    book = (await session.execute(query)).one_or_none()
+    if book is not None and (book.old_title, book.old_author) != (book.title, book.author):
+        record_books_removed(session, [(book.old_title, book.old_author)])
+        record_books_added(session, [(book.title, book.author)])
+    return book
+
+
+async def delete_book_returning(session: AsyncSession, book_id: int) -> Optional[Row]:
+    """Удаляет книгу одним DELETE ... RETURNING. Возвращает id, seller_id, title и author удаленной книги
+    или None, если книги не было."""
+    query = (
+        delete(Book)
+        .where(Book.id == book_id)
+        .returning(Book.id, Book.seller_id, Book.title, Book.author)
+        .execution_options(synchronize_session="fetch")
+    )
+    book = (await session.execute(query)).one_or_none()
+    if book is not None:
+        record_books_removed(session, [(book.title, book.author)])
+    return book
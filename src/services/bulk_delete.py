@@ -0,0 +1,94 @@
+# Фоновое удаление многих продавцов за раз.
+# Ручка только создает задачу и сразу отвечает 202, а задача удаляет продавцов пачками,
+# каждую пачку одним DELETE ... RETURNING в своей транзакции: блокировки держатся недолго,
+# а уже удаленные пачки не откатываются, если упадет следующая. Задачи живут в памяти процесса.
+import asyncio
+import contextvars
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Literal, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.services.cache import book_key, entity_cache, seller_key, seller_summary_key
+from src.services.sellers import delete_sellers_returning
+
+__all__ = [
+    "BulkDeleteJob", "start_bulk_delete", "get_bulk_delete_job", "wait_bulk_delete_jobs", "clear_bulk_delete_jobs",
+]
+
+logger = logging.getLogger(__name__)
+
+# Сколько продавцов удаляется одной транзакцией
+SELLERS_DELETE_BATCH_SIZE = 100
+# Сколько последних задач помнить для ручки статуса
+BULK_DELETE_JOBS_MAX = 1000
+
+
+@dataclass
+class BulkDeleteJob:
+    job_id: str
+    sellers_total: int
+    status: Literal["pending", "running", "done", "failed"] = "pending"
+    sellers_deleted: int = 0
+    books_deleted: int = 0
+    error: Optional[str] = None
+
+
+_jobs: OrderedDict[str, BulkDeleteJob] = OrderedDict()
+# Ссылки на запущенные задачи, иначе asyncio может собрать их сборщиком мусора до завершения
+_running: set[asyncio.Task] = set()
+
+
+def start_bulk_delete(session_factory: Callable[[], AsyncSession], seller_ids: list[int]) -> BulkDeleteJob:
+    """Создает задачу удаления продавцов и запускает ее в фоне, не дожидаясь завершения."""
+    seller_ids = list(dict.fromkeys(seller_ids))
+    job = BulkDeleteJob(job_id=uuid.uuid4().hex, sellers_total=len(seller_ids))
+    _jobs[job.job_id] = job
+    while len(_jobs) > BULK_DELETE_JOBS_MAX:
+        _jobs.popitem(last=False)
+
+    # Пустой контекст: запросы задачи не должны попадать в статистику и бюджет запроса, который ее создал
+    task = asyncio.create_task(_run(job, session_factory, seller_ids), context=contextvars.Context())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return job
+
+
+def get_bulk_delete_job(job_id: str) -> Optional[BulkDeleteJob]:
+    return _jobs.get(job_id)
+
+
+async def wait_bulk_delete_jobs() -> None:
+    """Дожидается всех запущенных задач (при остановке приложения и в тестах)."""
+    if _running:
+        await asyncio.gather(*_running, return_exceptions=True)
+
+
+def clear_bulk_delete_jobs() -> None:
+    _jobs.clear()
+
+
+async def _run(job: BulkDeleteJob, session_factory: Callable[[], AsyncSession], seller_ids: list[int]) -> None:
+    job.status = "running"
+    try:
+        async with session_factory() as session:
+            for start in range(0, len(seller_ids), SELLERS_DELETE_BATCH_SIZE):
+                sellers = await delete_sellers_returning(session, seller_ids[start:start + SELLERS_DELETE_BATCH_SIZE])
+                await session.commit()
+                # Кеш сбрасываем после commit: иначе параллельный запрос успел бы положить туда удаляемое
+                await entity_cache.invalidate(
+                    *(seller_key(seller.id) for seller in sellers),
+                    *(seller_summary_key(seller.id) for seller in sellers),
+                    *(book_key(book["id"]) for seller in sellers for book in seller.books),
+                )
+                job.sellers_deleted += len(sellers)
+                job.books_deleted += sum(len(seller.books) for seller in sellers)
+    except Exception as e:
+        logger.exception("Bulk delete job %s failed", job.job_id)
+        job.status = "failed"
+        job.error = str(e)
+        return
+    job.status = "done"
@@ -0,0 +1,130 @@
+# Read-through кеш для чтения книг и продавцов по id.
+# Ручки берут готовый (уже сериализованный) ответ из кеша, а при промахе идут в БД и кладут его туда.
+# Все пишущие ручки точечно удаляют затронутые ключи.
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from src.configurations.settings import settings
+
+__all__ = [
+    "CacheBackend", "LRUCacheBackend", "ReadThroughCache", "entity_cache", "book_key", "seller_key",
+    "seller_summary_key",
+]
+
+
+class CacheBackend(ABC):
+    """Интерфейс хранилища кеша. Асинхронный, чтобы позже можно было подключить общий кеш (Redis и т.п.)."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None: ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None: ...
+
+    @abstractmethod
+    async def clear(self) -> None: ...
+
+
+class LRUCacheBackend(CacheBackend):
+    """Ограниченный по размеру кеш в памяти процесса. Записи живут не дольше ttl секунд."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        self.discard(*keys)
+
+    def discard(self, *keys: str) -> None:
+        # Синхронный вариант delete для мест, где нельзя await (события SQLAlchemy)
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ReadThroughCache:
+    """Обертка над хранилищем со счетчиками попаданий и промахов."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self, key: str, loader: Callable[[], Awaitable[Optional[Any]]], store: bool = True
+    ) -> Optional[Any]:
+        # store=False - только читать из кеша, а загруженное не сохранять. Так читают из реплики:
+        # она может еще не получить запись, после которой ключ сбросили, и закешировала бы старые данные
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = await loader()
+        # Отсутствующие записи не кешируем, 404 всегда идет в БД
+        if value is not None and store:
+            await self.backend.set(key, value)
+        return value
+
+    async def invalidate(self, *keys: str) -> None:
+        if keys:
+            await self.backend.delete(*keys)
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+        self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        stats = {"hits": self.hits, "misses": self.misses}
+        if isinstance(self.backend, LRUCacheBackend):
+            stats["size"] = len(self.backend)
+            stats["max_size"] = self.backend.max_size
+        return stats
+
+
+def book_key(book_id: int) -> str:
+    return f"book:{book_id}"
+
+
+def seller_key(seller_id: int) -> str:
+    return f"seller:{seller_id}"
+
+
+def seller_summary_key(seller_id: int) -> str:
+    # Продавец без книг. Запись книг этот ключ не трогает, сбрасывают его только запись и удаление продавца
+    return f"seller-summary:{seller_id}"
+
+
+entity_cache = ReadThroughCache(
+    LRUCacheBackend(max_size=settings.cache_max_size, ttl=settings.cache_ttl_seconds)
+)
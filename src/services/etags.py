@@ -0,0 +1,123 @@
+# Условные запросы: ETag, If-None-Match и If-Match.
+# ETag строится из id и номеров версий строк (колонка version), а не из тела ответа.
+# Поэтому при совпадении с If-None-Match ручка отвечает 304 до сериализации ответа.
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, Request, Response, status
+from pydantic import BaseModel
+
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.monitoring.metrics import record_phase
+
+__all__ = [
+    "Representation", "book_etag", "book_version_etag", "seller_etag", "seller_version_etag", "seller_summary_etag",
+    "books_page_etag", "sellers_etag", "sellers_summary_etag",
+    "etag_headers", "not_modified", "conditional_response", "check_if_match", "precondition_failed",
+]
+
+# Клиент может хранить ответ, но перед использованием обязан сверить его с сервером по ETag
+CACHE_CONTROL = "private, no-cache"
+
+
+@dataclass(frozen=True, slots=True)
+class Representation:
+    """Готовый ответ ручки: сериализованное тело и его ETag. Такие объекты и лежат в кеше."""
+
+    etag: str
+    body: bytes
+
+    @classmethod
+    def build(cls, etag: str, model: BaseModel) -> "Representation":
+        # Тело сериализуется здесь, а не в FastAPI, поэтому и фаза serialize засекается здесь
+        started = time.perf_counter()
+        body = model.model_dump_json().encode()
+        record_phase("serialize", time.perf_counter() - started)
+        return cls(etag=etag, body=body)
+
+
+def _make_etag(*parts) -> str:
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest() + '"'
+
+
+def book_etag(book: Book) -> str:
+    return book_version_etag(book.id, book.version)
+
+
+def book_version_etag(book_id: int, version: int) -> str:
+    return _make_etag("book", book_id, version)
+
+
+def seller_etag(seller: Seller) -> str:
+    return seller_version_etag(seller.id, seller.version, [(book.id, book.version) for book in seller.books])
+
+
+def seller_version_etag(seller_id: int, version: int, book_versions: Iterable[tuple[int, int]]) -> str:
+    # Продавец отдается вместе с книгами, поэтому ETag меняется и при изменении любой его книги
+    return _make_etag("seller", seller_id, version, sorted(book_versions))
+
+
+def seller_summary_etag(seller_id: int, version: int) -> str:
+    # Продавец без книг (ответ без ?include=books): от книг не зависит
+    return _make_etag("seller-summary", seller_id, version)
+
+
+def books_page_etag(books: Iterable[Book], next_cursor: Optional[str]) -> str:
+    return _make_etag("books", [(book.id, book.version) for book in books], next_cursor)
+
+
+def sellers_etag(sellers: Iterable) -> str:
+    # Строки sellers_with_books_query: книги приходят JSON-массивом, а books_total меняется
+    # и от книг, не попавших в books_limit
+    return _make_etag(
+        "sellers",
+        [
+            (seller.id, seller.version, seller.books_total, [(book["id"], book["version"]) for book in seller.books])
+            for seller in sellers
+        ],
+    )
+
+
+def sellers_summary_etag(sellers: Iterable) -> str:
+    return _make_etag("sellers-summary", [(seller.id, seller.version) for seller in sellers])
+
+
+def _parse_etags(header: str, weak: bool) -> set[str]:
+    # Для If-None-Match сравнение слабое (W/ игнорируется), для If-Match - строгое
+    tags = {tag.strip() for tag in header.split(",")}
+    return {tag.removeprefix("W/") for tag in tags} if weak else tags
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Ответ 304, если у клиента уже есть эта версия, иначе None."""
+    header = request.headers.get("if-none-match")
+    if header is not None and ({"*", etag} & _parse_etags(header, weak=True)):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+    return None
+
+
+def conditional_response(request: Request, representation: Representation) -> Response:
+    if response := not_modified(request, representation.etag):
+        return response
+    return Response(
+        content=representation.body, media_type="application/json", headers=etag_headers(representation.etag)
+    )
+
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Resource has been modified")
+
+
+def check_if_match(request: Request, *etags: str) -> None:
+    """Оптимистичная блокировка: запись идет, только если клиент видел текущую версию.
+    Ресурс с несколькими представлениями (продавец с книгами и без) передает ETag каждого."""
+    header = request.headers.get("if-match")
+    if header is not None and not ({"*", *etags} & _parse_etags(header, weak=False)):
+        raise precondition_failed()
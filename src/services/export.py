@@ -0,0 +1,92 @@
+# Потоковая выгрузка продавцов вместе с книгами.
+# Строки читаются серверным курсором asyncpg пачками по EXPORT_CHUNK_SIZE и сразу уходят клиенту,
+# поэтому память воркера не зависит от размера таблиц.
+import csv
+import io
+from typing import AsyncIterator, Callable
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.books import Book
+from src.models.sellers import Seller
+
+__all__ = ["EXPORT_MEDIA_TYPES", "stream_sellers_export"]
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CSV_HEADER = [
+    "seller_id", "first_name", "second_name", "e_mail",
+    "book_id", "title", "author", "year", "pages",
+]
+
+# Плоский запрос без ORM-объектов: строки не попадают в identity map сессии
+_export_query = (
+    select(
+        Seller.id, Seller.first_name, Seller.second_name, Seller.e_mail,
+        Book.id, Book.title, Book.author, Book.year, Book.pages,
+    )
+    .outerjoin(Book, Book.seller_id == Seller.id)
+    .order_by(Seller.id, Book.id)
+    .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+)
+
+
+def _ndjson_chunk(partition, state: dict) -> bytes:
+    # Строки идут отсортированными по продавцу, поэтому продавец собирается из соседних строк.
+    # Готовый продавец сериализуется, как только начинается следующий.
+    out = bytearray()
+    for seller_id, first_name, second_name, e_mail, book_id, title, author, year, pages in partition:
+        current = state.get("seller")
+        if current is None or current["id"] != seller_id:
+            if current is not None:
+                out += orjson.dumps(current) + b"\n"
+            current = state["seller"] = {
+                "id": seller_id,
+                "first_name": first_name,
+                "second_name": second_name,
+                "e_mail": e_mail,
+                "books": [],
+            }
+        if book_id is not None:
+            current["books"].append({
+                "id": book_id,
+                "title": title,
+                "author": author,
+                "year": year,
+                "pages": pages,
+                "seller_id": seller_id,
+            })
+    return bytes(out)
+
+
+def _csv_chunk(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def stream_sellers_export(
+    session_factory: Callable[[], AsyncSession], export_format: str
+) -> AsyncIterator[bytes]:
+    async with session_factory() as session:
+        result = await session.stream(_export_query)
+
+        if export_format == "csv":
+            yield _csv_chunk([CSV_HEADER])
+            async for partition in result.partitions():
+                yield _csv_chunk(partition)
+            return
+
+        state: dict = {}
+        async for partition in result.partitions():
+            if chunk := _ndjson_chunk(partition, state):
+                yield chunk
+        if state.get("seller") is not None:
+            yield orjson.dumps(state["seller"]) + b"\n"
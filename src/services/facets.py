@@ -0,0 +1,62 @@
+# Фасеты каталога: сколько книг приходится на каждый год, автора и продавца среди книг,
+# подходящих под фильтры списка. Все группы и общее число считаются одним запросом с GROUPING SETS.
+# Результат кешируется по хешу фильтров на короткое время: после записи книг счетчики
+# могут отставать не дольше facets_cache_ttl_seconds.
+import hashlib
+
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.settings import settings
+from src.models.books import Book
+from src.schemas import BookFilters, ReturnedBookFacets
+from src.services.books import apply_book_filters
+from src.services.cache import LRUCacheBackend, ReadThroughCache
+
+__all__ = ["FACET_COLUMNS", "book_facets_query", "facet_cache", "facets_key", "load_book_facets"]
+
+# Колонки, по которым считаются фасеты. Порядок важен: по нему читается битовая маска grouping().
+FACET_COLUMNS = {"year": Book.year, "author": Book.author, "seller_id": Book.seller_id}
+
+# grouping(year, author, seller_id) ставит бит каждой колонке, которой нет в наборе группировки:
+# набор (year) дает 0b011, (author) - 0b101, (seller_id) - 0b110, пустой набор (все книги) - 0b111
+_FACET_BY_GROUPING = {0b011: "year", 0b101: "author", 0b110: "seller_id"}
+_TOTAL_GROUPING = 0b111
+
+facet_cache = ReadThroughCache(
+    LRUCacheBackend(max_size=settings.facets_cache_max_size, ttl=settings.facets_cache_ttl_seconds)
+)
+
+
+def facets_key(filters: BookFilters, limit: int) -> str:
+    digest = hashlib.sha1(filters.model_dump_json().encode()).hexdigest()
+    return f"facets:{digest}:{limit}"
+
+
+def book_facets_query(filters: BookFilters, limit: int) -> Select:
+    """Первые limit значений каждого фасета по числу книг и строка с общим числом книг."""
+    columns = list(FACET_COLUMNS.values())
+    counts = apply_book_filters(
+        select(*columns, func.grouping(*columns).label("grouping_set"), func.count().label("count")),
+        filters,
+    ).group_by(func.grouping_sets(*columns, tuple_())).subquery("counts")
+
+    rank = func.row_number().over(
+        partition_by=counts.c.grouping_set,
+        order_by=[counts.c["count"].desc(), *(counts.c[name] for name in FACET_COLUMNS)],
+    )
+    ranked = select(counts, rank.label("rank")).subquery("ranked")
+    return select(ranked).where(ranked.c.rank <= limit).order_by(ranked.c.grouping_set, ranked.c.rank)
+
+
+async def load_book_facets(session: AsyncSession, filters: BookFilters, limit: int) -> ReturnedBookFacets:
+    result = await session.execute(book_facets_query(filters, limit))
+    facets = {name: [] for name in FACET_COLUMNS}
+    total = 0
+    for row in result:
+        if row.grouping_set == _TOTAL_GROUPING:
+            total = row.count
+        else:
+            name = _FACET_BY_GROUPING[row.grouping_set]
+            facets[name].append({"value": row._mapping[name], "count": row.count})
+    return ReturnedBookFacets(total=total, **facets)
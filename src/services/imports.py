@@ -0,0 +1,107 @@
+# Импорт книг из CSV-файла через PostgreSQL COPY.
+# Файл читается пачками по IMPORT_BATCH_SIZE строк, каждая пачка валидируется и уходит
+# в COPY во временную таблицу. В books_table строки переносятся одним INSERT ... SELECT,
+# который заодно отбрасывает книги несуществующих продавцов.
+import csv
+import io
+from itertools import islice
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import column, func, insert, select, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.services.books import validate_incoming_books
+from src.services.suggest import record_books_added
+
+__all__ = ["import_books_csv"]
+
+IMPORT_BATCH_SIZE = 5000
+
+# Сколько ошибок валидации возвращать клиенту. Остальные только попадают в счетчик rejected.
+IMPORT_MAX_ERRORS = 100
+
+IMPORT_COLUMNS = ["title", "author", "year", "pages", "seller_id"]
+# pages необязательна: без нее книга получает значение по умолчанию
+REQUIRED_CSV_COLUMNS = [name for name in IMPORT_COLUMNS if name != "pages"]
+
+# Временная таблица живет до конца транзакции. Типы шире, чем в books_table,
+# чтобы слишком длинные строки отсекались в INSERT ... SELECT, а не роняли COPY.
+STAGING_TABLE = "books_import_staging"
+_create_staging = text(
+    f"CREATE TEMP TABLE {STAGING_TABLE} "
+    "(title text, author text, year integer, pages integer, seller_id integer) ON COMMIT DROP"
+)
+_staging = table(STAGING_TABLE, *(column(name) for name in IMPORT_COLUMNS))
+
+_move_from_staging = insert(Book).from_select(
+    IMPORT_COLUMNS,
+    select(*(_staging.c[name] for name in IMPORT_COLUMNS))
+    .join(Seller, Seller.id == _staging.c.seller_id)
+    .where(
+        func.char_length(_staging.c.title) <= Book.__table__.c.title.type.length,
+        func.char_length(_staging.c.author) <= Book.__table__.c.author.type.length,
+    ),
+).returning(Book.__table__.c.title, Book.__table__.c.author, Book.__table__.c.seller_id)
+
+
+def _read_batch(reader: csv.DictReader) -> list[dict]:
+    return list(islice(reader, IMPORT_BATCH_SIZE))
+
+
+def _as_incoming_book(row: dict) -> dict:
+    book = {"title": row["title"], "author": row["author"], "year": row["year"], "seller_id": row["seller_id"]}
+    # pages необязательна, пустое значение означает значение по умолчанию из IncomingBook
+    if row.get("pages"):
+        book["count_pages"] = row["pages"]
+    return book
+
+
+async def import_books_csv(session: AsyncSession, upload: UploadFile) -> dict:
+    connection = await session.connection()
+    driver_connection = (await connection.get_raw_connection()).driver_connection
+    await session.execute(_create_staging)
+
+    # Чтение файла блокирующее, поэтому каждая пачка читается в пуле потоков
+    stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    received, errors = 0, []
+    try:
+        # strict: битые кавычки - ошибка файла, а не склеенные в одно поле строки
+        reader = csv.DictReader(stream, strict=True)
+        header = await run_in_threadpool(lambda: reader.fieldnames)
+        if not header or not set(REQUIRED_CSV_COLUMNS).issubset(header):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"CSV must have columns: {', '.join(REQUIRED_CSV_COLUMNS)} (pages is optional)",
+            )
+
+        while batch := await run_in_threadpool(_read_batch, reader):
+            books, batch_errors = validate_incoming_books([_as_incoming_book(row) for row in batch])
+            for index, item_errors in batch_errors.items():
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({"index": received + index + 1, "errors": item_errors})
+            received += len(batch)
+
+            await driver_connection.copy_records_to_table(
+                STAGING_TABLE,
+                records=[(b.title, b.author, b.year, b.pages, b.seller_id) for _, b in books],
+                columns=IMPORT_COLUMNS,
+            )
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Уже скопированные пачки откатятся вместе с транзакцией запроса
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid CSV file: {e}")
+    finally:
+        stream.detach()
+
+    inserted = (await session.execute(_move_from_staging)).all()
+    record_books_added(session, ((title, author) for title, author, _ in inserted))
+    return {
+        "received": received,
+        "inserted": len(inserted),
+        "rejected": received - len(inserted),
+        "errors": errors,
+        # Продавцы, у которых появились книги, - для инвалидации их кеша
+        "seller_ids": {seller_id for _, _, seller_id in inserted},
+    }
@@ -0,0 +1,47 @@
+# Вспомогательные функции для keyset (курсорной) пагинации.
+# Курсор - это base64 от JSON с ключом сортировки и значениями последней строки страницы.
+# Клиент не должен разбирать его содержимое, он просто передает его обратно.
+import base64
+import binascii
+from typing import Any
+
+import orjson
+from fastapi import HTTPException, status
+
+__all__ = ["encode_cursor", "decode_cursor"]
+
+
+def encode_cursor(sort: str, values: list[Any]) -> str:
+    raw = orjson.dumps({"s": sort, "v": values})
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _matches_type(value: Any, expected: type) -> bool:
+    # bool в Python - подкласс int, а JSON-число без дробной части приходит как int и там, где ждем float
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def decode_cursor(cursor: str, sort: str, types: tuple[type, ...]) -> list[Any]:
+    """Значения курсора для сортировки sort. types - ожидаемые типы значений по порядку ключей сортировки:
+    подделанный курсор с чужими типами должен давать 400, а не ошибку БД."""
+    invalid_cursor = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+    )
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = orjson.loads(raw)
+    except (binascii.Error, ValueError):
+        raise invalid_cursor
+
+    # Курсор действителен только для той сортировки, с которой он был выдан
+    if not isinstance(payload, dict) or payload.get("s") != sort or not isinstance(payload.get("v"), list):
+        raise invalid_cursor
+
+    values = payload["v"]
+    if len(values) != len(types) or not all(map(_matches_type, values, types)):
+        raise invalid_cursor
+    return values
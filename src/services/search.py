@@ -0,0 +1,101 @@
+# Поиск книг по названию и автору.
+# Основа - полнотекстовый поиск по колонке search_vector (GIN-индекс), каждое слово запроса ищется
+# как префикс. Если в БД есть расширение pg_trgm, к нему добавляется нечеткое сравнение по триграммам,
+# которое находит книги и при опечатках. Без pg_trgm поиск просто работает без этой части.
+import logging
+import re
+from typing import Optional
+
+from sqlalchemy import Select, func, literal, literal_column, or_, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import aliased
+
+from src.models.books import Book
+from src.services.pagination import decode_cursor, encode_cursor
+
+__all__ = ["init_book_search", "search_books_query", "search_next_cursor"]
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация словаря: без стемминга, названия и имена бывают на разных языках
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+# Сколько совпадений максимум ранжируется для одного запроса: берутся самые новые (с большими id)
+SEARCH_MAX_CANDIDATES = 1000
+
+_trigram_enabled = False
+
+# Триграммные индексы создает миграция 0004, если в БД можно установить pg_trgm
+_trigram_indexes_query = text(
+    "SELECT to_regclass('ix_books_table_title_trgm') IS NOT NULL "
+    "AND to_regclass('ix_books_table_author_trgm') IS NOT NULL"
+)
+
+
+async def init_book_search(engine: AsyncEngine) -> bool:
+    """Включает нечеткий поиск, если миграции создали триграммные индексы (есть pg_trgm)."""
+    global _trigram_enabled
+
+    async with engine.connect() as connection:
+        _trigram_enabled = bool((await connection.execute(_trigram_indexes_query)).scalar_one())
+    if not _trigram_enabled:
+        logger.warning("pg_trgm is not available, book search works without typo tolerance")
+    return _trigram_enabled
+
+
+def _prefix_tsquery(q: str) -> Optional[str]:
+    # "clean arch" -> "clean:* & arch:*". Берем только буквы и цифры, поэтому синтаксис tsquery не сломать
+    words = re.findall(r"\w+", q.lower())
+    return " & ".join(f"{word}:*" for word in words) or None
+
+
+def _cursor_sort(q: str) -> str:
+    # Курсор привязан к тексту запроса: с другим q он недействителен
+    return f"search:{q}"
+
+
+def search_books_query(q: str, limit: int, cursor: Optional[str] = None) -> Optional[Select]:
+    """Запрос страницы найденных книг, лучшие совпадения первыми. None, если искать нечего.
+    Выбирает limit + 1 строку, чтобы понять, есть ли следующая страница."""
+    tsquery_text = _prefix_tsquery(q)
+    if tsquery_text is None:
+        return None
+
+    tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery_text)
+    matches = Book.search_vector.op("@@")(tsquery)
+    if _trigram_enabled:
+        # <% - "q похоже на какое-то слово или часть строки", тоже использует GIN-индекс (gin_trgm_ops)
+        matches = or_(matches, literal(q).op("<%")(Book.title), literal(q).op("<%")(Book.author))
+
+    # Ранжируются не все совпадения, а SEARCH_MAX_CANDIDATES самых новых: иначе запрос из одной
+    # частой буквы считал бы ранг по всему каталогу, и время ответа росло бы вместе с ним.
+    # ORDER BY нужен, чтобы набор кандидатов не менялся между страницами одного поиска.
+    candidates = aliased(
+        Book,
+        select(Book.__table__)
+        .where(matches)
+        .order_by(Book.id.desc())
+        .limit(SEARCH_MAX_CANDIDATES)
+        .subquery("candidates"),
+    )
+    rank = func.ts_rank_cd(candidates.search_vector, tsquery)
+    if _trigram_enabled:
+        rank = func.greatest(
+            rank, func.word_similarity(q, candidates.title), func.word_similarity(q, candidates.author)
+        )
+    rank = rank.label("rank")
+
+    query = select(candidates, rank)
+    if cursor is not None:
+        values = decode_cursor(cursor, _cursor_sort(q), (float, int))
+        query = query.where(tuple_(rank, candidates.id) < tuple_(*values))
+
+    return query.order_by(rank.desc(), candidates.id.desc()).limit(limit + 1)
+
+
+def search_next_cursor(rows: list, q: str, limit: int) -> Optional[str]:
+    """Курсор следующей страницы по строкам (Book, rank)."""
+    if len(rows) <= limit:
+        return None
+    book, rank = rows[limit - 1]
+    return encode_cursor(_cursor_sort(q), [rank, book.id])
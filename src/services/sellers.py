@@ -0,0 +1,149 @@
+# Чтение и запись продавцов, общие для нескольких ручек.
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import JSON, Row, Select, delete, func, insert, literal_column, select, true, type_coerce, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from src.models.books import Book
+from src.models.sellers import Seller, SellerStats
+from src.schemas import ReturnedSeller, ReturnedSellerSummary
+from src.services.books import book_order_by
+from src.services.etags import Representation, seller_etag, seller_summary_etag, seller_version_etag
+from src.services.suggest import record_books_removed
+
+__all__ = [
+    "load_seller", "load_seller_summary", "load_seller_summaries", "sellers_with_books_query", "seller_books_json", "create_seller_returning", "update_seller_returning", "load_seller_etag",
+    "delete_sellers_returning",
+]
+
+# Колонки продавца в ответах без книг и в ответах ручек записи
+_SELLER_COLUMNS = (Seller.id, Seller.first_name, Seller.second_name, Seller.e_mail, Seller.version)
+
+
+async def load_seller(session: AsyncSession, seller_id: int) -> Optional[Representation]:
+    """Продавец с книгами в виде готового ответа ReturnedSeller с ETag. Такие объекты и лежат в кеше."""
+    query = select(Seller).options(selectinload(Seller.books)).where(Seller.id == seller_id)
+    result = await session.execute(query)
+    if seller := result.scalar_one_or_none():
+        return Representation.build(seller_etag(seller), ReturnedSeller.model_validate(seller, from_attributes=True))
+    return None
+
+
+async def load_seller_summary(session: AsyncSession, seller_id: int) -> Optional[Representation]:
+    """Продавец без книг в виде готового ответа ReturnedSellerSummary с ETag: один запрос по первичному ключу,
+    без ORM-объектов."""
+    if seller := (await session.execute(select(*_SELLER_COLUMNS).where(Seller.id == seller_id))).one_or_none():
+        return Representation.build(
+            seller_summary_etag(seller.id, seller.version), ReturnedSellerSummary.model_validate(seller, from_attributes=True)
+        )
+    return None
+
+
+async def load_seller_summaries(session: AsyncSession) -> Sequence[Row]:
+    """Все продавцы без книг: строки с колонками sellers_table, без ORM-объектов и без запроса за книгами."""
+    return (await session.execute(select(*_SELLER_COLUMNS).order_by(Seller.id))).all()
+
+
+def sellers_with_books_query(books_limit: Optional[int] = None, books_order: str = "id") -> Select:
+    """Все продавцы с книгами одним запросом. Для каждого продавца LATERAL-подзапрос берет первые books_limit книг
+    в порядке books_order (без books_limit - все) и собирает их в JSON-массив books. Для порядков по id и году
+    есть индексы (seller_id, id) и (seller_id, year, id), остальные сортируют только книги одного продавца.
+    books_total - сколько всего книг у продавца, из сводки seller_stats_table, без подсчета по books_table."""
+    page = (
+        select(
+            Book.id, Book.title, Book.author, Book.year, Book.pages, Book.seller_id, Book.version,
+            func.row_number().over(order_by=book_order_by(books_order)).label("position"),
+        )
+        .where(Book.seller_id == Seller.id)
+        .order_by(*book_order_by(books_order))
+        .limit(books_limit)
+        .correlate(Seller)
+        .subquery("page")
+    )
+    book = func.json_build_object(
+        "id", page.c.id, "title", page.c.title, "author", page.c.author, "year", page.c.year,
+        "pages", page.c.pages, "seller_id", page.c.seller_id, "version", page.c.version,
+    )
+    books = select(
+        func.coalesce(func.json_agg(aggregate_order_by(book, page.c.position)), literal_column("'[]'::json")).label("books")
+    ).lateral("books")
+    return (
+        select(
+            *_SELLER_COLUMNS,
+            func.coalesce(SellerStats.books_count, 0).label("books_total"),
+            type_coerce(books.c.books, JSON).label("books"),
+        )
+        .outerjoin(SellerStats, SellerStats.seller_id == Seller.id)
+        # Агрегат без GROUP BY всегда возвращает ровно одну строку, поэтому хватает JOIN ... ON true
+        .join(books, true())
+        .order_by(Seller.id)
+    )
+
+
+def seller_books_json():
+    """Книги продавца одним JSON-массивом, по порядку id. Коррелированный подзапрос: его можно добавить
+    в SELECT или RETURNING по sellers_table, и книги придут в той же строке, без второго запроса."""
+    return _books_json(
+        "id", Book.id, "title", Book.title, "author", Book.author, "year", Book.year,
+        "pages", Book.pages, "seller_id", Book.seller_id, "version", Book.version,
+    )
+
+
+def _books_json(*fields):
+    book = func.json_build_object(*fields)
+    books = select(func.coalesce(func.json_agg(aggregate_order_by(book, Book.id)), literal_column("'[]'::json")))
+    return type_coerce(books.where(Book.seller_id == Seller.id).scalar_subquery(), JSON)
+
+
+async def create_seller_returning(session: AsyncSession, values: dict[str, Any]) -> Row:
+    """Создает продавца одним INSERT ... RETURNING. Книг у нового продавца нет, их не читаем."""
+    return (await session.execute(insert(Seller).values(**values).returning(*_SELLER_COLUMNS))).one()
+
+
+async def update_seller_returning(
+    session: AsyncSession,
+    seller_id: int,
+    values: dict[str, Any],
+    version: Optional[int] = None,
+    include_books: bool = False,
+) -> Optional[Row]:
+    """Изменяет продавца одним UPDATE ... RETURNING и увеличивает версию. С include_books в той же строке
+    приходят его книги (books), без него книги не читаются. None, если продавца нет или его версия уже не равна version."""
+    columns = (*_SELLER_COLUMNS, seller_books_json().label("books")) if include_books else _SELLER_COLUMNS
+    query = (
+        update(Seller)
+        .where(Seller.id == seller_id)
+        .values(**values, version=Seller.version + 1)
+        .returning(*columns)
+        # Объекты продавца, уже загруженные в сессию, обновляются по RETURNING, без отдельного SELECT
+        .execution_options(synchronize_session="fetch")
+    )
+    if version is not None:
+        query = query.where(Seller.version == version)
+    return (await session.execute(query)).one_or_none()
+
+
+async def load_seller_etag(session: AsyncSession, seller_id: int) -> Optional[tuple[int, str]]:
+    """Текущие версия и ETag продавца одним запросом, для проверки If-Match. None, если продавца нет."""
+    query = select(Seller.version, seller_books_json().label("books")).where(Seller.id == seller_id)
+    if row := (await session.execute(query)).one_or_none():
+        book_versions = [(book["id"], book["version"]) for book in row.books]
+        return row.version, seller_version_etag(seller_id, row.version, book_versions)
+    return None
+
+
+async def delete_sellers_returning(session: AsyncSession, seller_ids: list[int]) -> list[Row]:
+    """Удаляет продавцов одним DELETE ... RETURNING. Их книги и сводку удаляет БД по ON DELETE CASCADE,
+    а RETURNING еще видит книги до каскада: у каждой строки есть id продавца и books - id, title и author
+    его книг (для сброса кеша и индекса подсказок). Продавцов, которых не было, в ответе нет."""
+    query = (
+        delete(Seller)
+        .where(Seller.id.in_(seller_ids))
+        .returning(Seller.id, _books_json("id", Book.id, "title", Book.title, "author", Book.author).label("books"))
+        .execution_options(synchronize_session="fetch")
+    )
+    sellers = (await session.execute(query)).all()
+    record_books_removed(session, [(book["title"], book["author"]) for seller in sellers for book in seller.books])
+    return sellers
@@ -0,0 +1,181 @@
+# Подсказки для поиска по мере ввода: префиксный индекс названий и авторов книг в памяти процесса.
+# Индекс строится при старте приложения из books_table и дальше обновляется вместе с записью книг:
+# события ORM (создание, изменение, удаление книги, в том числе каскадом с продавцом) и явные вызовы
+# для пакетной загрузки и импорта. Изменения копятся в сессии и попадают в подсказки только после commit,
+# при откате транзакции они просто отбрасываются: незакоммиченные книги другие запросы не увидят.
+# Индекс у каждого процесса свой: записи, сделанные другими воркерами, он увидит после перезапуска.
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from heapq import nlargest
+from typing import Iterable, Union
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from src.models.books import Book
+
+__all__ = ["PrefixIndex", "BookSuggestions", "book_suggestions", "record_books_added", "record_books_removed"]
+
+# Больше любого символа в ключе: prefix + _MAX_CHAR - верхняя граница ключей, начинающихся с prefix
+_MAX_CHAR = chr(0x10FFFF)
+
+# Чтение books_table при построении индекса идет пачками, без загрузки всей таблицы разом
+REBUILD_BATCH_SIZE = 10000
+
+
+def _normalize(value: str) -> str:
+    return value.casefold()
+
+
+class PrefixIndex:
+    """Отсортированный массив ключей и поиск по префиксу бинарным поиском.
+    Для каждого ключа хранится, сколько книг с каждым вариантом написания значения и всего."""
+
+    def __init__(self):
+        self._keys: list[str] = []
+        self._values: dict[str, Counter] = {}
+        self._totals: dict[str, int] = {}
+
+    def build(self, values: Iterable[str]) -> None:
+        # Одна сортировка всего массива дешевле, чем вставка значений по одному
+        values_by_key: dict[str, Counter] = {}
+        for value in values:
+            values_by_key.setdefault(_normalize(value), Counter())[value] += 1
+        self._values = values_by_key
+        self._totals = {key: variants.total() for key, variants in values_by_key.items()}
+        self._keys = sorted(values_by_key)
+
+    def add(self, value: str) -> None:
+        key = _normalize(value)
+        if key not in self._values:
+            insort(self._keys, key)
+            self._values[key] = Counter()
+            self._totals[key] = 0
+        self._values[key][value] += 1
+        self._totals[key] += 1
+
+    def remove(self, value: str) -> None:
+        key = _normalize(value)
+        variants = self._values.get(key)
+        if not variants or value not in variants:
+            return
+        variants[value] -= 1
+        self._totals[key] -= 1
+        if variants[value] <= 0:
+            del variants[value]
+        if not variants:
+            del self._values[key]
+            del self._totals[key]
+            del self._keys[bisect_left(self._keys, key)]
+
+    def complete(self, prefix: str, limit: int) -> list[str]:
+        """limit самых частых значений, начинающихся с prefix (без учета регистра), при равенстве - по алфавиту."""
+        prefix = _normalize(prefix)
+        start = bisect_left(self._keys, prefix)
+        end = bisect_right(self._keys, prefix + _MAX_CHAR, lo=start)
+        # nlargest устойчива: ключи с одинаковым числом книг остаются в алфавитном порядке
+        top_keys = nlargest(limit, self._keys[start:end], key=self._totals.__getitem__)
+        # Из вариантов написания одного значения показываем самый частый
+        return [self._values[key].most_common(1)[0][0] for key in top_keys]
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._values.clear()
+        self._totals.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class BookSuggestions:
+    def __init__(self):
+        self.titles = PrefixIndex()
+        self.authors = PrefixIndex()
+
+    def add(self, title: str, author: str) -> None:
+        self.titles.add(title)
+        self.authors.add(author)
+
+    def remove(self, title: str, author: str) -> None:
+        self.titles.remove(title)
+        self.authors.remove(author)
+
+    def suggest(self, prefix: str, limit: int) -> dict:
+        return {"titles": self.titles.complete(prefix, limit), "authors": self.authors.complete(prefix, limit)}
+
+    async def rebuild(self, engine: AsyncEngine) -> None:
+        titles, authors = [], []
+        async with engine.connect() as connection:
+            result = await connection.stream(
+                select(Book.title, Book.author).execution_options(yield_per=REBUILD_BATCH_SIZE)
+            )
+            async for title, author in result:
+                titles.append(title)
+                authors.append(author)
+        self.titles.build(titles)
+        self.authors.build(authors)
+
+    def clear(self) -> None:
+        self.titles.clear()
+        self.authors.clear()
+
+
+book_suggestions = BookSuggestions()
+
+# Изменения индекса в текущей транзакции сессии: (+1 или -1, название, автор), в порядке записи
+_CHANGES_KEY = "book_suggestions_changes"
+
+
+def _record(session: Union[Session, AsyncSession, None], sign: int, title: str, author: str) -> None:
+    # Объект вне сессии писать в БД нечем, значит и в подсказки нечего добавлять
+    if session is not None:
+        session.info.setdefault(_CHANGES_KEY, []).append((sign, title, author))
+
+
+def record_books_added(session: AsyncSession, books: Iterable[tuple[str, str]]) -> None:
+    """Для вставок в обход событий ORM (INSERT ... RETURNING пачками, импорт через COPY):
+    их события не видят, поэтому код записи сообщает о книгах сам."""
+    for title, author in books:
+        _record(session, 1, title, author)
+
+
+def record_books_removed(session: AsyncSession, books: Iterable[tuple[str, str]]) -> None:
+    """Для изменений и удалений в обход событий ORM (UPDATE/DELETE ... RETURNING)."""
+    for title, author in books:
+        _record(session, -1, title, author)
+
+
+@event.listens_for(Book, "after_insert")
+def _book_inserted(mapper, connection, target: Book) -> None:
+    _record(object_session(target), 1, target.title, target.author)
+
+
+@event.listens_for(Book, "after_update")
+def _book_updated(mapper, connection, target: Book) -> None:
+    state = inspect(target)
+    old_title = state.committed_state.get("title", target.title)
+    old_author = state.committed_state.get("author", target.author)
+    if (old_title, old_author) != (target.title, target.author):
+        session = object_session(target)
+        _record(session, -1, old_title, old_author)
+        _record(session, 1, target.title, target.author)
+
+
+@event.listens_for(Book, "after_delete")
+def _book_deleted(mapper, connection, target: Book) -> None:
+    _record(object_session(target), -1, target.title, target.author)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session: Session) -> None:
+    for sign, title, author in session.info.pop(_CHANGES_KEY, []):
+        if sign > 0:
+            book_suggestions.add(title, author)
+        else:
+            book_suggestions.remove(title, author)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_changes(session: Session) -> None:
+    session.info.pop(_CHANGES_KEY, None)
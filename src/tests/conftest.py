@@ -4,16 +4,19 @@
 """
 
 import asyncio
+from contextlib import asynccontextmanager
 
 import httpx
 import pytest
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+from src.configurations.database import discard_after_commit, recreate_db, run_after_commit
 from src.configurations.settings import settings
 from src.models import books  # noqa
-from src.models.base import BaseModel
+from src.monitoring.metrics import instrument_engine
 from src.models.books import Book  # noqa F401
+from src.models.users import User  # noqa F401
 
 # Переопределяем движок для запуска тестов и подключаем его к тестовой базе.
 # Это решает проблему с сохранностью данных в основной базе приложения.
@@ -24,6 +27,9 @@ async_test_engine = create_async_engine(
     echo=True,
 )
 
+# Считаем запросы тестового движка так же, как в приложении
+instrument_engine(async_test_engine)
+
 # Создаем фабрику сессий для тестового движка.
 async_test_session = async_sessionmaker(
     async_test_engine, expire_on_commit=False, autoflush=False
@@ -41,12 +47,44 @@ def event_loop():
 
 
 # Создаем таблицы в тестовой БД. Предварительно удаляя старые.
+# Схему строят те же миграции, что и в приложении, а не create_all по моделям.
 @pytest_asyncio.fixture(scope="session", autouse=True)
 async def create_tables() -> None:
     """Create tables in DB."""
-    async with async_test_engine.begin() as connection:
-        await connection.run_sync(BaseModel.metadata.drop_all)
-        await connection.run_sync(BaseModel.metadata.create_all)
+    await recreate_db(async_test_engine)
+
+
+# Кеши живут в памяти процесса, поэтому чистим их между тестами
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def clear_caches():
+    from auth.deps import principal_cache
+    from src.services.bulk_delete import clear_bulk_delete_jobs
+    from src.services.cache import entity_cache
+    from src.services.facets import facet_cache
+    from src.services.suggest import book_suggestions
+
+    await entity_cache.clear()
+    await facet_cache.clear()
+    book_suggestions.clear()
+    await principal_cache.clear()
+    clear_bulk_delete_jobs()
+
+
+# В тестах бюджеты запросов ручек (@query_budget) строгие: превышение роняет тест
+@pytest.fixture(scope="function", autouse=True)
+def strict_query_budgets(monkeypatch):
+    monkeypatch.setattr(settings, "dev_mode", True)
+    monkeypatch.setattr(settings, "db_query_budget_strict", True)
+
+
+# Проверка числа запросов к БД внутри блока:
+# with assert_max_queries(2):
+#     await async_client.get(...)
+@pytest.fixture(scope="function")
+def assert_max_queries():
+    from src.monitoring.queries import assert_max_queries
+
+    return assert_max_queries
 
 
 # Создаем сессию для БД используемую для тестов
@@ -62,23 +100,68 @@ async def db_session():
 @pytest.fixture(scope="function")
 def override_get_async_session(db_session):
     async def _override_get_async_session():
-        yield db_session
+        # Тестовая сессия не коммитит: отложенные до commit вызовы (сброс кеша) и слушатели after_commit
+        # (подсказки) вызываем после запроса, а если запрос упал - отбрасываем, как при откате
+        try:
+            yield db_session
+        except Exception:
+            discard_after_commit(db_session)
+            db_session.sync_session.dispatch.after_rollback(db_session.sync_session)
+            raise
+        db_session.sync_session.dispatch.after_commit(db_session.sync_session)
+        await run_after_commit(db_session)
 
     return _override_get_async_session
 
 
+# Коллбэк для переопределения фабрики сессий (ей пользуются стриминговые ручки).
+# Фабрика отдает ту же тестовую сессию и не закрывает ее.
+@pytest.fixture(scope="function")
+def override_get_session_factory(db_session):
+    @asynccontextmanager
+    async def _test_session():
+        yield db_session
+
+    def _override_get_session_factory():
+        return _test_session
+
+    return _override_get_session_factory
+
+
 # Мы не можем создать 2 приложения (app) - это приведет к ошибкам.
 # Поэтому, на время запуска тестов мы подменяем там зависимость с сессией
 @pytest.fixture(scope="function")
-def test_app(override_get_async_session):
-    from src.configurations.database import get_async_session
+def test_app(override_get_async_session, override_get_session_factory):
+    from src.configurations.database import (
+        get_async_read_session,
+        get_async_session,
+        get_read_session_factory,
+        get_session_factory,
+    )
     from src.main import app
 
+    # Чтение и запись в тестах идут через одну сессию, иначе ручки не увидят данные теста
     app.dependency_overrides[get_async_session] = override_get_async_session
+    app.dependency_overrides[get_async_read_session] = override_get_async_session
+    app.dependency_overrides[get_session_factory] = override_get_session_factory
+    app.dependency_overrides[get_read_session_factory] = override_get_session_factory
 
     return app
 
 
+# Заголовки с токеном настоящего пользователя для защищенных ручек
+@pytest_asyncio.fixture(scope="function")
+async def auth_headers(db_session):
+    from auth.utils import create_access_token
+
+    user = User(e_mail="tester@example.com", password="not_a_real_hash")
+    db_session.add(user)
+    await db_session.flush()
+
+    token = create_access_token({"sub": str(user.id)})
+    return {"Authorization": f"Bearer {token}"}
+
+
 # создаем асинхронного клиента для ручек
 @pytest_asyncio.fixture(scope="function")
 async def async_client(test_app):
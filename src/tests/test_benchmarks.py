@@ -0,0 +1,36 @@
+from src.benchmarks.report import compare_reports, percentile, summarize
+from src.benchmarks.scenarios import uncovered_routes
+from src.routers import v1_router
+
+
+# У каждой ручки v1 должен быть сценарий нагрузки
+def test_every_v1_route_has_benchmark_scenario():
+    assert uncovered_routes(v1_router) == []
+
+
+def test_summarize_latencies():
+    latencies = [i / 1000 for i in range(1, 101)]  # 1..100 мс
+    result = summarize(latencies, {200: 98, 500: 2}, elapsed=2.0)
+
+    assert result["requests"] == 100
+    assert result["errors"] == 2
+    assert result["rps"] == 50.0
+    assert result["p50_ms"] == 50.0
+    assert result["p99_ms"] == 99.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_compare_reports_flags_regressions():
+    def report(p99_ms, rps):
+        return {"results": {"asgi": {"GET /api/v1/books/": {
+            "10": {"rps": rps, "p50_ms": 1.0, "p99_ms": p99_ms, "errors": 0},
+        }}}}
+
+    baseline = report(p99_ms=10.0, rps=1000.0)
+
+    assert compare_reports(report(p99_ms=11.0, rps=950.0), baseline, tolerance=0.2) == []
+    regressions = compare_reports(report(p99_ms=20.0, rps=500.0), baseline, tolerance=0.2)
+    assert len(regressions) == 2
+    assert "p99" in regressions[0] and "throughput" in regressions[1]
+    # Замеров, которых нет в эталоне, сравнение не касается
+    assert compare_reports(report(p99_ms=20.0, rps=500.0), {"results": {}}, tolerance=0.2) == []
@@ -2,13 +2,15 @@ import pytest
 from sqlalchemy import select
 from src.models.books import Book
 from src.models.sellers import Seller
+from src.services import search
+from src.services.pagination import encode_cursor
 from fastapi import status
 from icecream import ic
 
 
 # Тест на ручку создающую книгу
 @pytest.mark.asyncio
-async def test_create_book(async_client, db_session):
+async def test_create_book(async_client, db_session, auth_headers):
 
     # Сначала создаём продавца
     seller_data = {
@@ -27,7 +29,7 @@ async def test_create_book(async_client, db_session):
         "year": 2025,
         "seller_id": seller.id
     }
-    response = await async_client.post("/api/v1/books/", json=data)
+    response = await async_client.post("/api/v1/books/", json=data, headers=auth_headers)
 
     assert response.status_code == status.HTTP_201_CREATED
 
@@ -46,7 +48,7 @@ async def test_create_book(async_client, db_session):
 
 
 @pytest.mark.asyncio
-async def test_create_book_with_old_year(async_client, db_session):
+async def test_create_book_with_old_year(async_client, db_session, auth_headers):
     # Сначала создаём продавца
     seller_data = {
         "first_name": "John",
@@ -64,7 +66,7 @@ async def test_create_book_with_old_year(async_client, db_session):
         "count_pages": 300,
         "year": 1986,
     }
-    response = await async_client.post("/api/v1/books/", json=data)
+    response = await async_client.post("/api/v1/books/", json=data, headers=auth_headers)
 
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
@@ -118,10 +120,84 @@ async def test_get_books(db_session, async_client):
                 "pages": 104,
                 "seller_id": seller.id
             },
-        ]
+        ],
+        "next_cursor": None,
     }
 
 
+# Тест на постраничную выдачу списка книг
+@pytest.mark.asyncio
+async def test_get_books_paginated(db_session, async_client):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    books = [
+        Book(author="Pushkin", title=f"Tale {i}", year=2020 + i, pages=100, seller_id=seller.id)
+        for i in range(5)
+    ]
+    db_session.add_all(books)
+    await db_session.flush()
+
+    # Идем по страницам в порядке убывания года, пока курсор не закончится
+    seen = []
+    params = {"limit": 2, "sort": "-year"}
+    while True:
+        response = await async_client.get("/api/v1/books/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert len(page["books"]) <= 2
+        seen.extend(book["year"] for book in page["books"])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert seen == [2024, 2023, 2022, 2021, 2020]
+
+
+# Тест на фильтры списка книг
+@pytest.mark.asyncio
+async def test_get_books_filtered(db_session, async_client):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    seller_2 = Seller(first_name="Igor", second_name="Sidorov", e_mail="igor@example.com", password="12334")
+    db_session.add_all([seller, seller_2])
+    await db_session.flush()
+
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    book_2 = Book(author="Pushkin", title="Dubrovsky", year=2021, pages=104, seller_id=seller.id)
+    book_3 = Book(author="Pushkin", title="Poltava", year=2022, pages=104, seller_id=seller_2.id)
+    book_4 = Book(author="Lermontov", title="Mziri", year=2023, pages=104, seller_id=seller.id)
+    db_session.add_all([book, book_2, book_3, book_4])
+    await db_session.flush()
+
+    response = await async_client.get(
+        "/api/v1/books/",
+        params={"seller_id": seller.id, "author": "Pushkin", "year_from": 2020},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [b["id"] for b in response.json()["books"]] == [book_2.id]
+
+
+@pytest.mark.asyncio
+async def test_get_books_with_invalid_cursor(async_client):
+    response = await async_client.get("/api/v1/books/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # Подделанный курсор с правильной сортировкой, но значениями не тех типов: 400, а не ошибка БД
+    for values in (["x", "y"], [2020, "y"], [True, 1]):
+        cursor = encode_cursor("year", values)
+        response = await async_client.get("/api/v1/books/", params={"sort": "year", "cursor": cursor})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    cursor = encode_cursor("search:clean", ["x", 1])
+    response = await async_client.get("/api/v1/books/search", params={"q": "clean", "cursor": cursor})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = await async_client.get("/api/v1/books/", params={"limit": 100000})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 # Тест на ручку получения одной книги
 @pytest.mark.asyncio
 async def test_get_single_book(db_session, async_client):
@@ -162,7 +238,7 @@ async def test_get_single_book(db_session, async_client):
 
 # Тест на ручку обновления книги
 @pytest.mark.asyncio
-async def test_update_book(db_session, async_client):
+async def test_update_book(db_session, async_client, auth_headers):
     # Сначала создаём продавца
     seller_data = {
         "first_name": "John",
@@ -191,6 +267,7 @@ async def test_update_book(db_session, async_client):
             "id": book.id,
             "seller_id": seller.id
         },
+        headers=auth_headers,
     )
 
     assert response.status_code == status.HTTP_200_OK
@@ -257,3 +334,370 @@ async def test_delete_book_with_invalid_book_id(db_session, async_client):
     response = await async_client.delete(f"/api/v1/books/{book.id + 1}")
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Тест на ручку пакетной загрузки книг
+@pytest.mark.asyncio
+async def test_create_books_bulk(db_session, async_client, auth_headers):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    data = [
+        {"title": "Clean Architecture", "author": "Robert Martin", "count_pages": 300, "year": 2025, "seller_id": seller.id},
+        {"title": "Old Book", "author": "Robert Martin", "count_pages": 300, "year": 1986, "seller_id": seller.id},
+        {"title": "Clean Code", "author": "Robert Martin", "year": 2021, "seller_id": seller.id},
+        {"title": "Orphan", "author": "Nobody", "year": 2022, "seller_id": seller.id + 1000},
+        {"title": "No author", "year": 2022, "seller_id": seller.id},
+    ]
+    response = await async_client.post("/api/v1/books/bulk", json=data, headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    result_data = response.json()
+
+    assert [(b["title"], b["pages"]) for b in result_data["books"]] == [
+        ("Clean Architecture", 300),
+        ("Clean Code", 150),
+    ]
+    assert [e["index"] for e in result_data["errors"]] == [1, 3, 4]
+    assert result_data["errors"][0]["errors"][0]["loc"] == ["year"]
+    assert result_data["errors"][1]["errors"][0]["loc"] == ["seller_id"]
+
+    books = (await db_session.execute(select(Book))).scalars().all()
+    assert sorted(b.title for b in books) == ["Clean Architecture", "Clean Code"]
+
+
+# Тест на порядок созданных книг: он совпадает с входным массивом,
+# даже когда вставка делится на несколько пачек insertmanyvalues
+@pytest.mark.asyncio
+async def test_create_books_bulk_keeps_input_order(db_session, async_client, auth_headers, monkeypatch):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+    connection = await db_session.connection()
+    monkeypatch.setattr(connection.dialect, "insertmanyvalues_page_size", 10)
+
+    titles = [f"Book {n}" for n in range(35, 0, -1)]
+    data = [{"title": title, "author": "Robert Martin", "year": 2021, "seller_id": seller.id} for title in titles]
+    response = await async_client.post("/api/v1/books/bulk", json=data, headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [book["title"] for book in response.json()["books"]] == titles
+
+
+# Тест на импорт книг из CSV-файла
+@pytest.mark.asyncio
+async def test_import_books_csv(db_session, async_client, auth_headers):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    content = (
+        "title,author,year,pages,seller_id\n"
+        f"Clean Architecture,Robert Martin,2025,300,{seller.id}\n"
+        f"Old Book,Robert Martin,1986,300,{seller.id}\n"
+        f'"Clean Code, 2nd edition",Robert Martin,2021,,{seller.id}\n'
+        f"Orphan,Nobody,2022,100,{seller.id + 1000}\n"
+    )
+    response = await async_client.post(
+        "/api/v1/books/import",
+        files={"file": ("books.csv", content.encode(), "text/csv")},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    result_data = response.json()
+    assert result_data["received"] == 4
+    assert result_data["inserted"] == 2
+    assert result_data["rejected"] == 2
+    assert [e["index"] for e in result_data["errors"]] == [2]
+
+    books = (await db_session.execute(select(Book).order_by(Book.id))).scalars().all()
+    assert [(b.title, b.pages) for b in books] == [("Clean Architecture", 300), ("Clean Code, 2nd edition", 150)]
+
+
+@pytest.mark.asyncio
+async def test_import_books_csv_without_required_columns(async_client, auth_headers):
+    response = await async_client.post(
+        "/api/v1/books/import",
+        files={"file": ("books.csv", b"name,year\nfoo,2021\n", "text/csv")},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "CSV must have columns: title, author, year, seller_id (pages is optional)"
+
+
+# Тест на импорт файла, который не читается как CSV в UTF-8: 400, а не 500
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "row", [b"\xff\xfe broken,Author,2021,100,1\n", b'"Unclosed,Author,2021,100,1\n'], ids=["not-utf8", "quoting"]
+)
+async def test_import_books_csv_malformed_file(async_client, auth_headers, row):
+    content = b"title,author,year,pages,seller_id\n" + row
+    response = await async_client.post(
+        "/api/v1/books/import", files={"file": ("books.csv", content, "text/csv")}, headers=auth_headers
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"].startswith("Invalid CSV file")
+
+
+# Тест на кеширование книги и его сброс при обновлении
+@pytest.mark.asyncio
+async def test_get_single_book_cached(db_session, async_client, auth_headers):
+    from src.services.cache import entity_cache
+
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    db_session.add(book)
+    await db_session.flush()
+
+    first = await async_client.get(f"/api/v1/books/{book.id}")
+    second = await async_client.get(f"/api/v1/books/{book.id}")
+
+    assert first.json() == second.json()
+    assert entity_cache.stats()["hits"] == 1
+    assert entity_cache.stats()["misses"] == 1
+
+    response = await async_client.put(
+        f"/api/v1/books/{book.id}",
+        json={"title": "Mziri", "author": "Lermontov", "pages": 100, "year": 2007, "id": book.id, "seller_id": seller.id},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    assert response.json()["title"] == "Mziri"
+
+
+# Тест на условный GET: ETag книги, 304 при совпадении и новый ETag после обновления
+@pytest.mark.asyncio
+async def test_get_book_etag(db_session, async_client, auth_headers):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    db_session.add(book)
+    await db_session.flush()
+
+    response = await async_client.get(f"/api/v1/books/{book.id}")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = await async_client.get(f"/api/v1/books/{book.id}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = await async_client.put(
+        f"/api/v1/books/{book.id}",
+        json={"title": "Mziri", "author": "Lermontov", "pages": 100, "year": 2007, "id": book.id, "seller_id": seller.id},
+        headers={**auth_headers, "If-Match": etag},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+
+    response = await async_client.get(f"/api/v1/books/{book.id}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "Mziri"
+
+
+# Тест на оптимистичную блокировку: PUT с устаревшим If-Match не проходит
+@pytest.mark.asyncio
+async def test_update_book_if_match_stale(db_session, async_client, auth_headers):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    db_session.add(book)
+    await db_session.flush()
+
+    response = await async_client.put(
+        f"/api/v1/books/{book.id}",
+        json={"title": "Mziri", "author": "Lermontov", "pages": 100, "year": 2007, "id": book.id, "seller_id": seller.id},
+        headers={**auth_headers, "If-Match": '"stale"'},
+    )
+
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    assert book.title == "Eugeny Onegin"
+
+
+# Тест на ETag страницы списка: не изменилась - 304, изменилась книга на странице - новый ETag
+@pytest.mark.asyncio
+async def test_get_books_page_etag(db_session, async_client):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    db_session.add(book)
+    await db_session.flush()
+
+    url = f"/api/v1/books/?seller_id={seller.id}"
+    etag = (await async_client.get(url)).headers["etag"]
+
+    response = await async_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    book.pages = 200
+    await db_session.flush()
+
+    response = await async_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+
+
+# Тест на поиск книг: префиксы слов, ранжирование (название важнее автора) и курсор
+@pytest.mark.asyncio
+async def test_search_books(db_session, async_client):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    by_title = Book(author="Robert Martin", title="Clean Code", year=2008, pages=464, seller_id=seller.id)
+    by_author = Book(author="Cleanthes", title="Hymn to Zeus", year=2020, pages=10, seller_id=seller.id)
+    other = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    db_session.add_all([by_title, by_author, other])
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "clea", "limit": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    first_page = response.json()
+    assert [book["id"] for book in first_page["books"]] == [by_title.id]
+    assert first_page["next_cursor"]
+
+    response = await async_client.get(
+        "/api/v1/books/search", params={"q": "clea", "limit": 1, "cursor": first_page["next_cursor"]}
+    )
+    second_page = response.json()
+    assert [book["id"] for book in second_page["books"]] == [by_author.id]
+    assert second_page["next_cursor"] is None
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "clean martin"})
+    assert [book["id"] for book in response.json()["books"]] == [by_title.id]
+
+    # Курсор действителен только для того q, с которым был выдан
+    response = await async_client.get("/api/v1/books/search", params={"q": "clean", "cursor": first_page["next_cursor"]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "%%"})
+    assert response.json() == {"books": [], "next_cursor": None}
+
+
+# Тест на ограничение поиска: ранжируются только SEARCH_MAX_CANDIDATES самых новых совпадений,
+# и этот набор не меняется от страницы к странице
+@pytest.mark.asyncio
+async def test_search_books_candidates_cap(db_session, async_client, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_MAX_CANDIDATES", 3)
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    books = [
+        Book(author="Robert Martin", title="Clean Code", year=2008, pages=464, seller_id=seller.id) for _ in range(5)
+    ]
+    db_session.add_all(books)
+    await db_session.flush()
+
+    found, cursor = [], None
+    while True:
+        params = {"q": "clean", "limit": 2} | ({"cursor": cursor} if cursor else {})
+        page = (await async_client.get("/api/v1/books/search", params=params)).json()
+        found += [book["id"] for book in page["books"]]
+        if not (cursor := page["next_cursor"]):
+            break
+
+    # Ранг у всех одинаковый, поэтому порядок - по id, и это три самые новые книги
+    assert found == sorted((book.id for book in books), reverse=True)[:3]
+
+
+# Тест на фасеты: счетчики по годам, авторам и продавцам считаются с теми же фильтрами, что и список
+@pytest.mark.asyncio
+async def test_get_book_facets(db_session, async_client, assert_max_queries):
+    seller = Seller(first_name="Ivan", second_name="Petrov", e_mail="ivan@petrov.ru", password="12345")
+    other = Seller(first_name="Anna", second_name="Orlova", e_mail="anna@orlova.ru", password="12345")
+    db_session.add_all([seller, other])
+    await db_session.flush()
+    db_session.add_all([
+        Book(title="Dune", author="Herbert", year=1965, pages=600, seller_id=seller.id),
+        Book(title="Dune Messiah", author="Herbert", year=1969, pages=300, seller_id=seller.id),
+        Book(title="Solaris", author="Lem", year=1961, pages=200, seller_id=seller.id),
+        Book(title="Eden", author="Lem", year=1959, pages=250, seller_id=other.id),
+    ])
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/facets", params={"seller_id": seller.id, "limit": 2})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "total": 3,
+        "year": [{"value": 1961, "count": 1}, {"value": 1965, "count": 1}],
+        "author": [{"value": "Herbert", "count": 2}, {"value": "Lem", "count": 1}],
+        "seller_id": [{"value": seller.id, "count": 3}],
+    }
+
+    response = await async_client.get("/api/v1/books/facets", params={"year_to": 1961})
+    assert response.json()["total"] == 2
+    assert response.json()["author"] == [{"value": "Lem", "count": 2}]
+
+    # Повторный запрос с теми же фильтрами отдается из кеша, без запроса к БД
+    with assert_max_queries(0):
+        response = await async_client.get("/api/v1/books/facets", params={"year_to": 1961})
+    assert response.json()["total"] == 2
+
+
+# Тест на частичное обновление книги: меняются только переданные поля, запись - один UPDATE
+@pytest.mark.asyncio
+async def test_patch_book(db_session, async_client, auth_headers, assert_max_queries):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    db_session.add(book)
+    await db_session.flush()
+    etag = (await async_client.get(f"/api/v1/books/{book.id}")).headers["ETag"]
+
+    # Пользователь и сам UPDATE ... RETURNING
+    with assert_max_queries(2):
+        response = await async_client.patch(f"/api/v1/books/{book.id}", json={"pages": 120}, headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "id": book.id, "title": "Eugeny Onegin", "author": "Pushkin", "year": 2001, "pages": 120, "seller_id": seller.id,
+    }
+    assert book.pages == 120
+    assert response.headers["ETag"] != etag
+
+    # ETag, полученный до изменения, уже устарел
+    response = await async_client.patch(
+        f"/api/v1/books/{book.id}", json={"title": "Mziri"}, headers={**auth_headers, "If-Match": etag},
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    etag = (await async_client.get(f"/api/v1/books/{book.id}")).headers["ETag"]
+    response = await async_client.patch(
+        f"/api/v1/books/{book.id}", json={"title": "Mziri"}, headers={**auth_headers, "If-Match": etag},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "Mziri"
+
+    response = await async_client.patch(f"/api/v1/books/{book.id + 1}", json={"pages": 1}, headers=auth_headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={}, headers=auth_headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    # Год проверяется так же, как при создании книги
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"year": 1999}, headers=auth_headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = await async_client.patch(f"/api/v1/books/{book.id}", json={"year": None, "pages": 130}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["year"] == 2001
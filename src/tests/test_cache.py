@@ -0,0 +1,45 @@
+import pytest
+
+from src.services.cache import LRUCacheBackend, ReadThroughCache
+
+
+@pytest.mark.asyncio
+async def test_lru_cache_evicts_least_recently_used():
+    backend = LRUCacheBackend(max_size=2, ttl=60)
+    await backend.set("a", 1)
+    await backend.set("b", 2)
+    assert await backend.get("a") == 1  # "a" становится самым свежим
+
+    await backend.set("c", 3)
+
+    assert await backend.get("b") is None
+    assert await backend.get("a") == 1
+    assert await backend.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_lru_cache_expires_by_ttl():
+    backend = LRUCacheBackend(max_size=10, ttl=0)
+    await backend.set("a", 1)
+
+    assert await backend.get("a") is None
+    assert len(backend) == 0
+
+
+@pytest.mark.asyncio
+async def test_read_through_cache_counts_hits_and_misses():
+    cache = ReadThroughCache(LRUCacheBackend(max_size=10, ttl=60))
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return {"id": 1}
+
+    assert await cache.get_or_load("book:1", loader) == {"id": 1}
+    assert await cache.get_or_load("book:1", loader) == {"id": 1}
+    await cache.invalidate("book:1")
+    assert await cache.get_or_load("book:1", loader) == {"id": 1}
+
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,254 @@
+import pytest
+
+from src.configurations import database
+from src.configurations.database import (
+    TimedQueuePool,
+    call_after_commit,
+    create_engine,
+    create_read_only_session_factory,
+    discard_after_commit,
+    pool_stats,
+    run_after_commit,
+    warm_up_pool,
+)
+from src.models.base import BaseModel
+from src.models.sellers import Seller
+from src.services.cache import LRUCacheBackend, ReadThroughCache
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from src.configurations.settings import settings
+
+
+# Тест на прогрев пула: после старта нужные соединения уже открыты и свободны
+@pytest.mark.asyncio
+async def test_warm_up_pool():
+    engine = create_engine(settings.database_test_url)
+    try:
+        assert isinstance(engine.pool, TimedQueuePool)
+
+        await warm_up_pool(engine)
+
+        stats = pool_stats(engine)
+        expected = min(settings.db_pool_min_size, settings.max_connection_count)
+        assert stats["size"] == settings.max_connection_count
+        assert stats["idle"] == expected
+        assert stats["checked_out"] == 0
+        assert stats["wait_count"] == expected
+
+        async with engine.connect():
+            assert pool_stats(engine)["checked_out"] == 1
+    finally:
+        await engine.dispose()
+
+
+async def _read_current_database(session_generator) -> tuple[str, bool]:
+    # Какая БД ответила сессии из get_async_read_session и помечена ли сессия как реплика
+    session = await anext(session_generator)
+    try:
+        return await session.scalar(text("SELECT current_database()")), database.is_replica_session(session)
+    finally:
+        await session_generator.aclose()
+
+
+# Тест на выбор реплики для чтения на двух настоящих БД: primary - тестовая БД, реплика - db_replica_test_name.
+# Из реплики кеш сущностей не заполняется, из primary - заполняется.
+@pytest.mark.asyncio
+@pytest.mark.skipif(not settings.database_replica_test_url, reason="DB_REPLICA_TEST_NAME is not configured")
+async def test_read_session_routing_to_replica(monkeypatch):
+    primary_engine = create_engine(settings.database_test_url)
+    monkeypatch.setattr(database, "__session_factory", async_sessionmaker(primary_engine))
+    monkeypatch.setattr(database, "__read_only_session_factory", create_read_only_session_factory(primary_engine))
+    monkeypatch.setattr(settings, "db_replica_lag_check_interval", 0)
+
+    database.init_replica(settings.database_replica_test_url)
+    try:
+        replica_engine = database.__replica_engine
+        assert await database.replica_lag(replica_engine) == 0
+
+        assert await database.choose_read_session_factory() is database.__replica_session_factory
+        assert await _read_current_database(database.get_async_read_session()) == (
+            settings.db_replica_test_name, True
+        )
+
+        cache = ReadThroughCache(LRUCacheBackend(max_size=10, ttl=60))
+        async for session in database.get_async_read_session():
+            await cache.get_or_load(
+                "key", lambda: session.scalar(text("SELECT 1")), store=not database.is_replica_session(session)
+            )
+        assert await cache.backend.get("key") is None
+
+        # Реплика "отстала" сильнее допустимого - при следующей проверке чтение уходит в primary
+        monkeypatch.setattr(settings, "db_replica_max_lag_seconds", -1)
+        assert await database.choose_read_session_factory() is database.__session_factory
+        assert await _read_current_database(database.get_async_read_session()) == (settings.db_test_name, False)
+
+        async for session in database.get_async_read_session():
+            await cache.get_or_load(
+                "key", lambda: session.scalar(text("SELECT 1")), store=not database.is_replica_session(session)
+            )
+        assert await cache.backend.get("key") == 1
+    finally:
+        await replica_engine.dispose()
+        await primary_engine.dispose()
+        database.init_replica(None)
+
+
+# Тест на сессию только для чтения: запросы идут без транзакции, запись запрещена и в ORM, и в самой БД
+@pytest.mark.asyncio
+async def test_read_only_session():
+    engine = create_engine(settings.database_test_url, read_only=True)
+    try:
+        # У пула для чтения свой размер, он не удваивает пул для записи
+        assert pool_stats(engine)["size"] == settings.db_read_pool_size
+        assert pool_stats(engine)["max_overflow"] == settings.db_read_pool_max_overflow
+
+        async with create_read_only_session_factory(engine)() as session:
+            await session.execute(select(Seller))
+
+            connection = await session.connection()
+            driver_connection = (await connection.get_raw_connection()).driver_connection
+            assert not driver_connection.is_in_transaction()
+
+            session.add(Seller(first_name="Ivan", second_name="Petrov", e_mail="ivan@petrov.ru", password="pass"))
+            with pytest.raises(RuntimeError):
+                await session.flush()
+            session.expunge_all()
+
+            # Запрос в обход ORM отклоняет Postgres
+            with pytest.raises(DBAPIError, match="read-only transaction"):
+                await session.execute(update(Seller).values(first_name="Ivan"))
+    finally:
+        await engine.dispose()
+
+
+# Тест на отложенные до commit вызовы: при откате они отбрасываются, после commit выполняются по порядку
+@pytest.mark.asyncio
+async def test_after_commit_callbacks(db_session):
+    calls = []
+
+    async def callback(*args):
+        calls.append(args)
+
+    call_after_commit(db_session, callback, 1)
+    discard_after_commit(db_session)
+    await run_after_commit(db_session)
+    assert calls == []
+
+    call_after_commit(db_session, callback, 1, 2)
+    call_after_commit(db_session, callback, 3)
+    assert calls == []
+    await run_after_commit(db_session)
+    assert calls == [(1, 2), (3,)]
+
+    # Выполненные вызовы не повторяются при следующем commit
+    await run_after_commit(db_session)
+    assert calls == [(1, 2), (3,)]
+
+
+def _schema_diff(connection, metadata) -> list:
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    context = MigrationContext.configure(
+        connection,
+        # Триграммные индексы необязательны и в моделях не описаны
+        opts={"include_object": lambda obj, name, type_, *_: not (type_ == "index" and name.endswith("_trgm"))},
+    )
+    return compare_metadata(context, metadata)
+
+
+# Тест на миграции: схема после alembic upgrade head совпадает с моделями,
+# то есть для каждого изменения моделей написана миграция
+@pytest.mark.asyncio
+async def test_migrations_match_models(db_session):
+    connection = await db_session.connection()
+    assert await connection.run_sync(_schema_diff, BaseModel.metadata) == []
+
+
+# Схема, которую create_all строил до перехода на миграции
+_create_all_metadata = MetaData()
+Table(
+    "sellers_table", _create_all_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("first_name", String(50), nullable=False),
+    Column("second_name", String(50), nullable=False),
+    Column("e_mail", String(50), nullable=False),
+    Column("password", String(50), nullable=False),
+)
+Table(
+    "books_table", _create_all_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("title", String(50), nullable=False),
+    Column("author", String(100), nullable=False),
+    Column("year", Integer, nullable=False),
+    Column("pages", Integer, nullable=False),
+    Column("seller_id", Integer, ForeignKey("sellers_table.id", ondelete="CASCADE"), nullable=False),
+)
+Table(
+    "users_table", _create_all_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("e_mail", String, unique=True, nullable=False),
+    Column("password", String, nullable=False),
+)
+
+
+def _run_alembic(connection, *commands: tuple[str, str]) -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(database.ALEMBIC_CONFIG_PATH)
+    config.attributes["connection"] = connection
+    for name, revision in commands:
+        getattr(command, name)(config, revision)
+
+
+async def _recreate_schema(engine, schema: str) -> None:
+    async with engine.begin() as connection:
+        await connection.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await connection.execute(text(f"CREATE SCHEMA {schema}"))
+
+
+# Тест на переход с create_all на миграции: ревизия 0001 совпадает со старой схемой,
+# а после alembic stamp 0001 и upgrade head схема совпадает с моделями и данные на месте.
+# Все делается в отдельной схеме PostgreSQL тестовой БД: у движка search_path только на нее,
+# поэтому и миграции, и сравнение схем видят только ее (pg_trgm там недоступен, триграммных индексов не будет).
+@pytest.mark.asyncio
+async def test_migrations_upgrade_database_created_by_create_all():
+    admin_engine = create_async_engine(settings.database_test_url, poolclass=NullPool)
+    engine = create_async_engine(
+        settings.database_test_url, poolclass=NullPool, connect_args={"server_settings": {"search_path": "migrations_check"}}
+    )
+    try:
+        await _recreate_schema(admin_engine, "migrations_check")
+        async with engine.begin() as connection:
+            await connection.run_sync(_run_alembic, ("upgrade", "0001"))
+            assert await connection.run_sync(_schema_diff, _create_all_metadata) == []
+
+        await _recreate_schema(admin_engine, "migrations_check")
+        async with engine.begin() as connection:
+            await connection.run_sync(_create_all_metadata.create_all)
+            await connection.execute(text(
+                "INSERT INTO sellers_table (id, first_name, second_name, e_mail, password) "
+                "VALUES (1, 'Ivan', 'Petrov', 'ivan@petrov.ru', 'pass')"
+            ))
+            await connection.execute(text(
+                "INSERT INTO books_table (title, author, year, pages, seller_id) "
+                "VALUES ('Clean Code', 'Robert Martin', 2008, 464, 1)"
+            ))
+
+            await connection.run_sync(_run_alembic, ("stamp", "0001"), ("upgrade", "head"))
+
+            assert await connection.run_sync(_schema_diff, BaseModel.metadata) == []
+            book = (await connection.execute(text(
+                "SELECT version, search_vector @@ to_tsquery('simple', 'clean') FROM books_table"
+            ))).one()
+            assert tuple(book) == (1, True)
+            stats = (await connection.execute(text("SELECT seller_id, books_count FROM seller_stats_table"))).all()
+            assert [tuple(row) for row in stats] == [(1, 1)]
+    finally:
+        async with admin_engine.begin() as connection:
+            await connection.execute(text("DROP SCHEMA IF EXISTS migrations_check CASCADE"))
+        await engine.dispose()
+        await admin_engine.dispose()
@@ -0,0 +1,128 @@
+import os
+
+import fastapi.routing
+import pytest
+from fastapi import status
+from sqlalchemy import text
+
+from src.configurations.settings import settings
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.monitoring.metrics import Histogram, metrics_registry
+from src.monitoring.queries import QueryBudgetExceeded
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((0.01, 0.1, 1.0))
+    for _ in range(90):
+        histogram.observe(0.005)
+    for _ in range(10):
+        histogram.observe(0.5)
+
+    assert histogram.count == 100
+    assert histogram.quantile(0.5) <= 0.01
+    assert 0.1 < histogram.quantile(0.99) <= 1.0
+
+
+# Тест на ручку /metrics: запросы группируются по шаблону пути и считают обращения к БД
+@pytest.mark.asyncio
+async def test_metrics(db_session, async_client):
+    metrics_registry.clear()
+
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    db_session.add(seller)
+    await db_session.flush()
+
+    await async_client.get(f"/api/v1/books/{seller.id + 1000}")
+    await async_client.get(f"/api/v1/books/{seller.id + 1001}")
+
+    response = await async_client.get("/metrics")
+
+    assert response.status_code == status.HTTP_200_OK
+    labels = 'method="GET",route="/api/v1/books/{book_id}"'
+    assert f'http_requests_total{{{labels},status="404"}} 2' in response.text
+    assert f'http_request_duration_seconds_count{{{labels}}} 2' in response.text
+    assert f'db_queries_total{{{labels}}} 2' in response.text
+    assert f'http_request_duration_quantile_seconds{{{labels},quantile="0.99"}}' in response.text
+
+
+# Тест на заголовок Server-Timing с разбором времени по фазам
+@pytest.mark.asyncio
+async def test_server_timing_header(db_session, async_client, auth_headers):
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    db_session.add(seller)
+    await db_session.flush()
+
+    response = await async_client.get(f"/api/v1/sellers/{seller.id}", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    phases = {part.split(";")[0].strip() for part in response.headers["server-timing"].split(",")}
+    assert phases == {"auth", "serialize", "db", "app"}
+
+
+# Тест на фазу serialize у ручки с response_model: ее засекает маршрут, а сам FastAPI не подменяется
+@pytest.mark.asyncio
+async def test_server_timing_serialize_phase(async_client):
+    response = await async_client.get("/api/v1/sellers/stats")
+
+    assert response.status_code == status.HTTP_200_OK
+    phases = {part.split(";")[0].strip() for part in response.headers["server-timing"].split(",")}
+    assert "serialize" in phases
+    assert not hasattr(fastapi.routing.serialize_response, "_timed")
+
+
+# Тест на профилирование по заголовку: профиль медленного запроса сохраняется в файл
+@pytest.mark.asyncio
+async def test_profile_by_header(async_client, tmp_path, monkeypatch):
+    from src.configurations.settings import settings
+
+    monkeypatch.setattr(settings, "profiler_header_enabled", True)
+    monkeypatch.setattr(settings, "profiler_slow_threshold_ms", 0)
+    monkeypatch.setattr(settings, "profiler_output_dir", str(tmp_path))
+
+    response = await async_client.get("/api/v1/books/", headers={"X-Profile": "1"})
+
+    assert response.status_code == status.HTTP_200_OK
+    [profile] = os.listdir(tmp_path)
+    assert profile.endswith(".collapsed")
+    assert "GET-api_v1_books" in profile
+
+
+# Тест на отсутствие N+1: список продавцов с книгами - это 1 запрос при любом числе продавцов
+@pytest.mark.asyncio
+async def test_sellers_list_query_count(db_session, async_client, assert_max_queries):
+    for number in range(5):
+        seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail=f"seller{number}@mail.ru", password="pass")
+        seller.books = [Book(title="Clean Code", author="Robert Martin", year=2020, pages=400)]
+        db_session.add(seller)
+    await db_session.flush()
+    db_session.expunge_all()
+
+    with assert_max_queries(1):
+        response = await async_client.get("/api/v1/sellers/", params={"include": "books"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["sellers"]) == 5
+
+
+@pytest.mark.asyncio
+async def test_assert_max_queries_exceeded(db_session, assert_max_queries):
+    with pytest.raises(QueryBudgetExceeded, match="2 queries, expected at most 1") as error:
+        with assert_max_queries(1):
+            await db_session.execute(text("SELECT 1"))
+            await db_session.execute(text("SELECT 1"))
+
+    assert "2 x SELECT 1" in str(error.value)
+
+
+# Тест на бюджет ручки: превышение в строгом режиме роняет запрос, повторы запроса пишутся в лог
+@pytest.mark.asyncio
+async def test_query_budget_and_repeated_statements(db_session, async_client, monkeypatch, caplog):
+    from src.routers.v1.books import get_all_books
+
+    monkeypatch.setattr(get_all_books, "query_budget", 0)
+    monkeypatch.setattr(settings, "db_repeated_query_threshold", 1)
+
+    with pytest.raises(QueryBudgetExceeded, match="GET /api/v1/books/: 1 queries, budget is 0"):
+        await async_client.get("/api/v1/books/")
+    assert "possible N+1" in caplog.text
@@ -1,5 +1,12 @@
+import csv
+import io
+import json
+from contextlib import asynccontextmanager
+
 import pytest
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.configurations.database import run_after_commit
 from src.models.books import Book
 from src.models.sellers import Seller
 from fastapi import status
@@ -72,7 +79,7 @@ async def test_get_sellers(db_session, async_client):
     db_session.add_all([seller, seller_2])
     await db_session.flush()
 
-    response = await async_client.get("/api/v1/sellers/")
+    response = await async_client.get("/api/v1/sellers/", params={"include": "books"})
 
     assert response.status_code == status.HTTP_200_OK
 
@@ -113,9 +120,62 @@ async def test_get_sellers(db_session, async_client):
         assert actual_simplified == expected_sellers
 
 
+# Тест на ограничение числа книг у каждого продавца в списке: books_limit, books_order и books_total
+@pytest.mark.asyncio
+async def test_get_sellers_books_limit(db_session, async_client):
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    seller.books = [Book(author="Pushkin", title=f"Book {year}", year=year, pages=104) for year in (2001, 2003, 2002)]
+    seller_2 = Seller(first_name="Igor", second_name="Sidorov", e_mail="igorsidorov@mail.ru", password="word")
+    db_session.add_all([seller, seller_2])
+    await db_session.flush()
+
+    response = await async_client.get(
+        "/api/v1/sellers/", params={"include": "books", "books_limit": 2, "books_order": "-year"}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    sellers = response.json()["sellers"]
+    assert [seller["id"] for seller in sellers] == [seller.id, seller_2.id]
+    assert sellers[0]["books_total"] == 3
+    assert [book["year"] for book in sellers[0]["books"]] == [2003, 2002]
+    assert sellers[1]["books_total"] == 0
+    assert sellers[1]["books"] == []
+
+    # Без books_limit - все книги, по умолчанию в порядке id
+    response = await async_client.get("/api/v1/sellers/", params={"include": "books"})
+    assert [book["year"] for book in response.json()["sellers"][0]["books"]] == [2001, 2003, 2002]
+
+    response = await async_client.get("/api/v1/sellers/", params={"books_limit": 2})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+# Тест на список продавцов без ?include=books: только поля продавца, одним запросом
+@pytest.mark.asyncio
+async def test_get_sellers_without_books(db_session, async_client, assert_max_queries):
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    seller.books = [Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104)]
+    db_session.add(seller)
+    await db_session.flush()
+
+    with assert_max_queries(1):
+        response = await async_client.get("/api/v1/sellers/")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "sellers": [
+            {"id": seller.id, "first_name": "Evgeniy", "second_name": "Smirnov", "e_mail": "evgeniysmirnov@mail.ru"},
+        ]
+    }
+    etag = response.headers["etag"]
+    assert etag != (await async_client.get("/api/v1/sellers/", params={"include": "books"})).headers["etag"]
+
+    response = await async_client.get("/api/v1/sellers/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
 # Тест на ручку получения одного продавца
 @pytest.mark.asyncio
-async def test_get_single_seller(db_session, async_client):
+async def test_get_single_seller(db_session, async_client, auth_headers):
     # Создаем продавца вручную, а не через ручку, чтобы нам не попасться на ошибку которая
     # может случиться в POST ручке
     seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
@@ -124,7 +184,7 @@ async def test_get_single_seller(db_session, async_client):
     db_session.add_all([seller, seller_2])
     await db_session.flush()
 
-    response = await async_client.get(f"/api/v1/sellers/{seller.id}")
+    response = await async_client.get(f"/api/v1/sellers/{seller.id}", params={"include": "books"}, headers=auth_headers)
 
     assert response.status_code == status.HTTP_200_OK
 
@@ -137,6 +197,17 @@ async def test_get_single_seller(db_session, async_client):
         "books": [],
     }
 
+    # Без ?include=books - только поля продавца
+    response = await async_client.get(f"/api/v1/sellers/{seller.id}", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "first_name": "Evgeniy",
+        "second_name": "Smirnov",
+        "e_mail": "evgeniysmirnov@mail.ru",
+        "id": seller.id,
+    }
+
 # Тест на ручку обновления продавца
 @pytest.mark.asyncio
 async def test_update_seller(db_session, async_client):
@@ -197,4 +268,323 @@ async def test_delete_seller_with_invalid_seller_id(db_session, async_client):
 
     response = await async_client.delete(f"/api/v1/sellers/{seller.id + 1}")
 
-    assert response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Тест на удаление продавца с книгами одним запросом: книги и сводку удаляет каскад в БД
+@pytest.mark.asyncio
+async def test_delete_seller_cascades_in_db(db_session, async_client, auth_headers, assert_max_queries):
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    seller.books = [
+        Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104),
+        Book(author="Lermontov", title="Mziri", year=1997, pages=104),
+    ]
+    db_session.add(seller)
+    await db_session.flush()
+    seller_id, book_id = seller.id, seller.books[0].id
+    # Книга в кеше и в подсказках должна пропасть вместе с продавцом
+    await async_client.get(f"/api/v1/books/{book_id}")
+    suggestions = (await async_client.get("/api/v1/books/suggest", params={"prefix": "Eug"})).json()
+    assert "Eugeny Onegin" in suggestions["titles"]
+
+    with assert_max_queries(1):
+        response = await async_client.delete(f"/api/v1/sellers/{seller_id}")
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    # Ручки в тестах делят одну сессию, а книги удалила БД в обход ORM: забываем загруженные объекты
+    db_session.expunge_all()
+    remaining_books = await db_session.execute(select(Book.__table__).where(Book.seller_id == seller_id))
+    assert remaining_books.all() == []
+    assert (await async_client.get(f"/api/v1/books/{book_id}")).status_code == status.HTTP_404_NOT_FOUND
+    assert (await async_client.get(f"/api/v1/sellers/{seller_id}/stats")).status_code == status.HTTP_404_NOT_FOUND
+    suggestions = (await async_client.get("/api/v1/books/suggest", params={"prefix": "Eug"})).json()
+    assert "Eugeny Onegin" not in suggestions["titles"]
+
+
+# Тест на фоновое удаление многих продавцов: 202 с задачей, затем ее состояние по ссылке из Location
+@pytest.mark.asyncio
+async def test_bulk_delete_sellers(db_session, test_app, async_client, auth_headers):
+    from src.configurations.database import get_session_factory
+    from src.services.bulk_delete import wait_bulk_delete_jobs
+
+    sellers = [
+        Seller(first_name=f"Seller{n}", second_name="Bulk", e_mail=f"seller{n}@bulk.ru", password="pass")
+        for n in range(3)
+    ]
+    for seller in sellers:
+        seller.books = [Book(author="Pushkin", title=f"Book {n}", year=2001, pages=104) for n in range(2)]
+    db_session.add_all(sellers)
+    await db_session.flush()
+    seller_ids = [seller.id for seller in sellers]
+
+    # Задача коммитит каждую пачку, поэтому в тесте ее сессия работает в savepoint общей транзакции
+    connection = await db_session.connection()
+
+    @asynccontextmanager
+    async def savepoint_session():
+        async with AsyncSession(bind=connection, join_transaction_mode="create_savepoint") as session:
+            yield session
+
+    test_app.dependency_overrides[get_session_factory] = lambda: savepoint_session
+
+    ids = [*seller_ids[:2], seller_ids[0], seller_ids[-1] + 100]
+    # Без токена удалять нельзя
+    response = await async_client.post("/api/v1/sellers/bulk-delete", json={"ids": ids})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = await async_client.post("/api/v1/sellers/bulk-delete", json={"ids": ids}, headers=auth_headers)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["sellers_total"] == 3
+    await wait_bulk_delete_jobs()
+
+    response = await async_client.get(response.headers["location"])
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "job_id": response.json()["job_id"],
+        "status": "done",
+        "sellers_total": 3,
+        "sellers_deleted": 2,
+        "books_deleted": 4,
+        "error": None,
+    }
+
+    remaining = await db_session.execute(select(Seller.__table__.c.id).where(Seller.id.in_(seller_ids)))
+    assert remaining.scalars().all() == [seller_ids[2]]
+    remaining_books = await db_session.execute(select(Book.__table__.c.seller_id).where(Book.seller_id.in_(seller_ids)))
+    assert set(remaining_books.scalars().all()) == {seller_ids[2]}
+
+    response = await async_client.get("/api/v1/sellers/bulk-delete/unknown")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Тест на потоковую выгрузку продавцов в NDJSON
+@pytest.mark.asyncio
+async def test_export_sellers_ndjson(db_session, async_client):
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    seller_2 = Seller(first_name="Igor", second_name="Sidorov", e_mail="igorsidorov@mail.ru", password="word")
+    db_session.add_all([seller, seller_2])
+    await db_session.flush()
+
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    book_2 = Book(author="Lermontov", title="Mziri", year=1997, pages=104, seller_id=seller.id)
+    db_session.add_all([book, book_2])
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/sellers/export")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [
+        {
+            "id": seller.id,
+            "first_name": "Evgeniy",
+            "second_name": "Smirnov",
+            "e_mail": "evgeniysmirnov@mail.ru",
+            "books": [
+                {"id": book.id, "title": "Eugeny Onegin", "author": "Pushkin", "year": 2001, "pages": 104, "seller_id": seller.id},
+                {"id": book_2.id, "title": "Mziri", "author": "Lermontov", "year": 1997, "pages": 104, "seller_id": seller.id},
+            ],
+        },
+        {
+            "id": seller_2.id,
+            "first_name": "Igor",
+            "second_name": "Sidorov",
+            "e_mail": "igorsidorov@mail.ru",
+            "books": [],
+        },
+    ]
+
+
+# Тест на потоковую выгрузку продавцов в CSV
+@pytest.mark.asyncio
+async def test_export_sellers_csv(db_session, async_client):
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104, seller_id=seller.id)
+    db_session.add(book)
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/sellers/export", params={"format": "csv"})
+
+    assert response.status_code == status.HTTP_200_OK
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows == [
+        ["seller_id", "first_name", "second_name", "e_mail", "book_id", "title", "author", "year", "pages"],
+        [str(seller.id), "Evgeniy", "Smirnov", "evgeniysmirnov@mail.ru", str(book.id), "Eugeny Onegin", "Pushkin", "2001", "104"],
+    ]
+
+
+
+# Тест на кеш авторизованных пользователей: удаленный пользователь сразу теряет доступ
+@pytest.mark.asyncio
+async def test_get_single_seller_after_user_removed(db_session, async_client, auth_headers):
+    from auth.deps import principal_cache
+    from src.models.users import User
+
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    db_session.add(seller)
+    await db_session.flush()
+
+    response = await async_client.get(f"/api/v1/sellers/{seller.id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(principal_cache) == 1
+
+    user = (await db_session.execute(select(User).where(User.e_mail == "tester@example.com"))).scalar_one()
+    await db_session.delete(user)
+    await db_session.flush()
+    # Запись сбрасывается только после commit, иначе параллельный запрос вернул бы ее в кеш
+    assert len(principal_cache) == 1
+    await run_after_commit(db_session)
+    assert len(principal_cache) == 0
+
+    response = await async_client.get(f"/api/v1/sellers/{seller.id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+# Тест на ETag продавца: он меняется и при изменении книги продавца
+@pytest.mark.asyncio
+async def test_get_single_seller_etag(db_session, async_client, auth_headers):
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    book = Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104)
+    seller.books = [book]
+    db_session.add(seller)
+    await db_session.flush()
+
+    url = f"/api/v1/sellers/{seller.id}?include=books"
+    etag = (await async_client.get(url, headers=auth_headers)).headers["etag"]
+    summary_etag = (await async_client.get(f"/api/v1/sellers/{seller.id}", headers=auth_headers)).headers["etag"]
+
+    response = await async_client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = await async_client.put(
+        f"/api/v1/books/{book.id}",
+        json={"title": "Mziri", "author": "Lermontov", "pages": 100, "year": 2007, "id": book.id, "seller_id": seller.id},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+
+    # Продавец без книг от изменения книги не меняется
+    response = await async_client.get(
+        f"/api/v1/sellers/{seller.id}", headers={**auth_headers, "If-None-Match": summary_etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+# Тест на статистику продавцов: сводка меняется вместе с книгами в той же транзакции
+@pytest.mark.asyncio
+async def test_get_seller_stats(db_session, async_client, auth_headers):
+    seller = Seller(first_name="Ivan", second_name="Petrov", e_mail="ivan@petrov.ru", password="12345")
+    other = Seller(first_name="Anna", second_name="Orlova", e_mail="anna@orlova.ru", password="12345")
+    db_session.add_all([seller, other])
+    await db_session.flush()
+
+    response = await async_client.get(f"/api/v1/sellers/{seller.id}/stats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"seller_id": seller.id, "books_count": 0, "pages_total": 0, "newest_year": None}
+
+    book_ids = []
+    for year, pages in ((2021, 100), (2024, 300)):
+        response = await async_client.post(
+            "/api/v1/books/",
+            json={"title": "Book", "author": "Author", "year": year, "count_pages": pages, "seller_id": seller.id},
+            headers=auth_headers,
+        )
+        book_ids.append(response.json()["id"])
+
+    response = await async_client.get(f"/api/v1/sellers/{seller.id}/stats")
+    assert response.json() == {"seller_id": seller.id, "books_count": 2, "pages_total": 400, "newest_year": 2024}
+
+    # Самая новая книга уходит к другому продавцу: год пересчитывается по оставшимся
+    await async_client.put(
+        f"/api/v1/books/{book_ids[1]}",
+        json={"id": book_ids[1], "title": "Book", "author": "Author", "year": 2024, "pages": 300, "seller_id": other.id},
+        headers=auth_headers,
+    )
+    await async_client.delete(f"/api/v1/books/{book_ids[0]}")
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/sellers/stats", params={"ids": [seller.id, other.id]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["stats"] == [
+        {"seller_id": seller.id, "books_count": 0, "pages_total": 0, "newest_year": None},
+        {"seller_id": other.id, "books_count": 1, "pages_total": 300, "newest_year": 2024},
+    ]
+
+    response = await async_client.get("/api/v1/sellers/0/stats")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Тест на запись продавца одним запросом: с include=books книги приходят в RETURNING того же UPDATE
+@pytest.mark.asyncio
+async def test_update_seller_single_statement(db_session, async_client, auth_headers, assert_max_queries):
+    seller = Seller(first_name="Evgeniy", second_name="Smirnov", e_mail="evgeniysmirnov@mail.ru", password="pass")
+    seller.books = [Book(author="Pushkin", title="Eugeny Onegin", year=2001, pages=104)]
+    db_session.add(seller)
+    await db_session.flush()
+    etag = (await async_client.get(f"/api/v1/sellers/{seller.id}?include=books", headers=auth_headers)).headers["etag"]
+    summary_etag = (await async_client.get(f"/api/v1/sellers/{seller.id}", headers=auth_headers)).headers["etag"]
+
+    with assert_max_queries(1):
+        response = await async_client.put(f"/api/v1/sellers/{seller.id}?include=books", json={"first_name": "Eugene"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["first_name"] == "Eugene"
+    assert response.json()["books"] == [
+        {"id": seller.books[0].id, "title": "Eugeny Onegin", "author": "Pushkin", "year": 2001, "pages": 104,
+         "seller_id": seller.id},
+    ]
+    new_etag = response.headers["etag"]
+    assert new_etag != etag
+
+    # ETag из ответа PUT совпадает с тем, что отдает GET
+    response = await async_client.get(
+        f"/api/v1/sellers/{seller.id}?include=books", headers={**auth_headers, "If-None-Match": new_etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    for stale_etag in (etag, summary_etag):
+        response = await async_client.put(
+            f"/api/v1/sellers/{seller.id}", json={"first_name": "E."}, headers={"If-Match": stale_etag}
+        )
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    # If-Match принимает ETag продавца и с книгами, и без них
+    summary_etag = (await async_client.get(f"/api/v1/sellers/{seller.id}", headers=auth_headers)).headers["etag"]
+    response = await async_client.put(
+        f"/api/v1/sellers/{seller.id}", json={"first_name": "E."}, headers={"If-Match": summary_etag}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    # Без include=books UPDATE не читает книги, а ответ и ETag - как у GET продавца без книг
+    with assert_max_queries(1) as stats:
+        response = await async_client.put(f"/api/v1/sellers/{seller.id}", json={"first_name": "Eugene"})
+    assert response.status_code == status.HTTP_200_OK
+    assert "books" not in response.json()
+    assert not any("books_table" in statement for statement in stats.statements)
+    response = await async_client.get(
+        f"/api/v1/sellers/{seller.id}", headers={**auth_headers, "If-None-Match": response.headers["etag"]}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = await async_client.put(f"/api/v1/sellers/{seller.id + 1}", json={"first_name": "E."})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    with assert_max_queries(1):
+        response = await async_client.post(
+            "/api/v1/sellers/",
+            json={
+                "first_name": "Ivan", "second_name": "Petrov",
+                "sellers_mail": "ivan@petrov.ru", "sellers_password": "12345",
+            },
+        )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["books"] == []
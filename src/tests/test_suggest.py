@@ -0,0 +1,78 @@
+import pytest
+from fastapi import status
+
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.services.suggest import PrefixIndex, book_suggestions
+
+
+def test_prefix_index_completes_most_frequent_first():
+    index = PrefixIndex()
+    index.build(["Clean Code", "Clean Architecture", "Code Complete", "clean code", "Clean Agile"])
+
+    # "Clean Code" встречается дважды (в разном регистре) и идет первым, хотя по алфавиту он последний
+    assert index.complete("clean", 10) == ["Clean Code", "Clean Agile", "Clean Architecture"]
+    assert index.complete("CL", 1) == ["Clean Code"]
+    assert index.complete("x", 10) == []
+
+    # После add частота меняется, и порядок вслед за ней
+    index.add("Clean Agile")
+    index.add("Clean Agile")
+    assert index.complete("clean", 2) == ["Clean Agile", "Clean Code"]
+
+
+def test_prefix_index_add_and_remove():
+    index = PrefixIndex()
+    index.add("Dune")
+    index.add("Dune")
+    index.remove("Dune")
+
+    assert index.complete("du", 10) == ["Dune"]  # осталась еще одна книга с этим названием
+
+    index.remove("Dune")
+    index.remove("Dune")  # повторное удаление ничего не ломает
+
+    assert index.complete("du", 10) == []
+    assert len(index) == 0
+
+
+# Тест на ручку подсказок: индекс следует за записью книг после commit, а откаченные записи в него не попадают
+@pytest.mark.asyncio
+async def test_suggest_follows_book_writes(db_session, async_client, auth_headers):
+    seller = Seller(first_name="John", second_name="Doe", e_mail="john@example.com", password="12334")
+    db_session.add(seller)
+    await db_session.flush()
+
+    response = await async_client.post(
+        "/api/v1/books/",
+        json={"title": "Clean Code", "author": "Robert Martin", "year": 2020, "seller_id": seller.id},
+        headers=auth_headers,
+    )
+    book_id = response.json()["id"]
+
+    response = await async_client.get("/api/v1/books/suggest", params={"prefix": "cle"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"titles": ["Clean Code"], "authors": []}
+
+    response = await async_client.put(
+        f"/api/v1/books/{book_id}",
+        json={"id": book_id, "title": "Refactoring", "author": "Martin Fowler", "year": 2020, "pages": 400,
+              "seller_id": seller.id},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert book_suggestions.suggest("cle", 10) == {"titles": [], "authors": []}
+    assert book_suggestions.suggest("mar", 10) == {"titles": [], "authors": ["Martin Fowler"]}
+
+    response = await async_client.delete(f"/api/v1/books/{book_id}")
+    await db_session.flush()
+    assert book_suggestions.suggest("ref", 10) == {"titles": [], "authors": []}
+
+    # До commit книги в подсказках нет, а после отката ее изменение забыто и следующий commit его не применит
+    db_session.add(Book(title="Dune", author="Frank Herbert", year=2020, pages=600, seller_id=seller.id))
+    await db_session.flush()
+    assert book_suggestions.suggest("d", 10)["titles"] == []
+
+    await db_session.rollback()
+    await async_client.get("/api/v1/books/")
+    assert book_suggestions.suggest("d", 10)["titles"] == []
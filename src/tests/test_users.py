@@ -0,0 +1,48 @@
+import pytest
+from fastapi import status
+from sqlalchemy import delete
+
+from src.models.users import User
+
+
+# Тест на ручку выдачи токена: регистрация, вход и неверный пароль
+@pytest.mark.asyncio
+async def test_get_or_create_token(db_session, async_client):
+    data = {"e_mail": "new_user@example.com", "password": "secret"}
+
+    # Ручка сама делает commit, поэтому пользователя удаляем в конце теста
+    try:
+        response = await async_client.post("/api/v1/token", json=data)
+        assert response.status_code == status.HTTP_200_OK
+        token = response.json()["access_token"]
+        assert token
+
+        response = await async_client.post("/api/v1/token", json=data)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await async_client.post("/api/v1/token", json={**data, "password": "wrong"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    finally:
+        await db_session.execute(delete(User).where(User.e_mail == data["e_mail"]))
+        await db_session.commit()
+
+
+# Тест на переполнение очереди хеширования паролей: лишние запросы сразу получают 503
+@pytest.mark.asyncio
+async def test_get_or_create_token_when_hash_queue_is_full(async_client, monkeypatch):
+    from src.configurations.settings import settings
+
+    monkeypatch.setattr(settings, "password_hash_max_queue", 0)
+
+    response = await async_client.post("/api/v1/token", json={"e_mail": "busy@example.com", "password": "secret"})
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_stats(async_client):
+    response = await async_client.get("/api/v1/internal/password-hashing")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["running"] == 0
+    assert response.json()["queued"] == 0